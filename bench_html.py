@@ -0,0 +1,80 @@
+"""Compare the single-pass HTML extractor with the previous BeautifulSoup path.
+
+Usage: python bench_html.py [--stories 400] [--repeat 5] [file.html ...]
+"""
+import argparse
+import re
+import time
+from typing import Callable, List, Tuple
+
+from bs4 import BeautifulSoup
+
+from src.email_parse import html_to_text_and_links
+
+
+def legacy_html_to_text_and_links(html: str) -> Tuple[str, List[str]]:
+    """The BeautifulSoup tree + replace_with + get_text path, followed by the
+    regex re-scan that extract_links used to do on its output."""
+    soup = BeautifulSoup(html, "lxml")
+    for a_tag in soup.find_all("a", href=True):
+        href = a_tag.get("href", "")
+        text = a_tag.get_text(strip=True)
+        if href and href.startswith(("http://", "https://")):
+            a_tag.replace_with(f"{text} {href} ")
+    for tag in soup(["script", "style", "noscript", "head", "meta", "link"]):
+        tag.decompose()
+    text = soup.get_text(separator="\n", strip=True)
+    text = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+    urls = re.findall(r"https?://[^\s<>\"{}|\\^`\[\]]+", text)
+    return text, list(dict.fromkeys(urls))
+
+
+def synthetic_newsletter(stories: int) -> str:
+    parts = ["<html><head><title>TLDR</title><style>p{margin:0}</style></head><body>"]
+    for i in range(stories):
+        parts.append(
+            f'<table><tr><td><h3><a href="https://tracking.example.com/CL0/{i}?utm_source=tldr">'
+            f"Story {i}: something shipped (4 minute read)</a></h3>"
+            f"<p>{'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8}"
+            # Outlook conditional comments split a text run like a tag does.
+            f"<!--[if mso]><table><tr><td><![endif]-->"
+            f"See https://example.com/bare/{i} for details.<!-- x -->Sponsored</p>"
+            f'<span style="display:none">&nbsp;</span></td></tr></table>'
+        )
+    parts.append('<script>var x = 1;</script><a href="https://advertise.tldr.tech/">Advertise</a></body></html>')
+    return "".join(parts)
+
+
+def _time(fn: Callable[[str], Tuple[str, List[str]]], html: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(html)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark HTML-to-text extraction")
+    parser.add_argument("files", nargs="*", help="HTML files to use instead of a synthetic newsletter")
+    parser.add_argument("--stories", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = [(path, open(path, encoding="utf-8", errors="replace").read()) for path in args.files]
+    if not samples:
+        samples = [(f"synthetic ({args.stories} stories)", synthetic_newsletter(args.stories))]
+
+    for label, html in samples:
+        legacy_text, legacy_links = legacy_html_to_text_and_links(html)
+        new_text, new_links = html_to_text_and_links(html)
+        legacy_s = _time(legacy_html_to_text_and_links, html, args.repeat)
+        new_s = _time(html_to_text_and_links, html, args.repeat)
+        print(f"{label}: {len(html) / 1024:.0f} KB")
+        print(f"  BeautifulSoup + regex  {legacy_s * 1000:8.1f} ms")
+        print(f"  single pass            {new_s * 1000:8.1f} ms  ({legacy_s / new_s:.1f}x faster)")
+        print(f"  text identical: {legacy_text == new_text}, links identical: {legacy_links == new_links}")
+
+
+if __name__ == "__main__":
+    main()
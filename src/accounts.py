@@ -0,0 +1,86 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import yaml
+
+
+DEFAULT_ACCOUNT = "default"
+
+
+@dataclass
+class MailAccount:
+    name: str
+    enabled: bool
+    user_env: str
+    password_env: str
+    mailboxes: List[str]
+    max_connections: int
+    host: Optional[str] = None
+    port: Optional[int] = None
+    tls: Optional[bool] = None
+
+
+@dataclass
+class MailboxSource:
+    account: MailAccount
+    mailbox: str
+
+    @property
+    def key(self) -> str:
+        # The default account keeps bare mailbox names so existing
+        # ingest_state rows and "INBOX:<uid>" source_uids stay valid.
+        if self.account.name == DEFAULT_ACCOUNT:
+            return self.mailbox
+        return f"{self.account.name}/{self.mailbox}"
+
+
+def _default_accounts() -> Dict[str, MailAccount]:
+    mailboxes = [
+        name.strip()
+        for name in os.getenv("IMAP_MAILBOXES", "INBOX").split(",")
+        if name.strip()
+    ]
+    return {
+        DEFAULT_ACCOUNT: MailAccount(
+            name=DEFAULT_ACCOUNT,
+            enabled=True,
+            user_env="IMAP_USER",
+            password_env="IMAP_PASSWORD",
+            mailboxes=mailboxes or ["INBOX"],
+            max_connections=2,
+        )
+    }
+
+
+def load_accounts(path: str = "accounts.yaml") -> Dict[str, MailAccount]:
+    if not os.path.exists(path):
+        return _default_accounts()
+
+    with open(path, "r", encoding="utf-8") as handle:
+        raw = yaml.safe_load(handle) or {}
+
+    accounts: Dict[str, MailAccount] = {}
+    for name, payload in (raw.get("accounts") or {}).items():
+        payload = payload or {}
+        accounts[name] = MailAccount(
+            name=name,
+            enabled=bool(payload.get("enabled", True)),
+            user_env=str(payload.get("user_env") or "IMAP_USER"),
+            password_env=str(payload.get("password_env") or "IMAP_PASSWORD"),
+            mailboxes=list(payload.get("mailboxes") or ["INBOX"]),
+            max_connections=max(1, int(payload.get("max_connections") or 2)),
+            host=payload.get("host"),
+            port=int(payload["port"]) if payload.get("port") else None,
+            tls=bool(payload["tls"]) if "tls" in payload else None,
+        )
+    return accounts or _default_accounts()
+
+
+def mailbox_sources(accounts: Dict[str, MailAccount]) -> List[MailboxSource]:
+    return [
+        MailboxSource(account=account, mailbox=mailbox)
+        for account in accounts.values()
+        if account.enabled
+        for mailbox in account.mailboxes
+    ]
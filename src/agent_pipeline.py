@@ -2,11 +2,16 @@ import json
 import os
 import random
 import re
+import threading
 import time
-from typing import Dict, List, Tuple, Union
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple, Union
 
+import httpx
 from openai import OpenAI
 
+from .env import safe_float, safe_int
+
 
 CATEGORIES = [
     "DevOps",
@@ -26,12 +31,123 @@ DOMAIN_TAGS = [
     "FinTech",
 ]
 
+# Defaults match the lowest paid tier for gpt-4o-mini; 0 disables a limit.
+OPENAI_RPM = 500
+OPENAI_TPM = 200_000
+# Reserved per call for the completion until the real usage is known.
+COMPLETION_TOKEN_ESTIMATE = 300
+
+# Digest items analyzed at once; also sizes the client's keep-alive pool.
+LLM_CONCURRENCY = 8
+OPENAI_TIMEOUT = 60.0
+OPENAI_CONNECT_TIMEOUT = 10.0
+OPENAI_KEEPALIVE_SECONDS = 60.0
+
+
+_client: Optional[OpenAI] = None
+_client_lock = threading.Lock()
+
 
 def _get_client() -> OpenAI:
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing required env var: OPENAI_API_KEY")
-    return OpenAI(api_key=api_key)
+    """Process-wide client, so every call reuses pooled keep-alive connections
+    instead of opening a new TLS session."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise RuntimeError("Missing required env var: OPENAI_API_KEY")
+            pool_size = max(1, safe_int(os.getenv("LLM_CONCURRENCY"), LLM_CONCURRENCY))
+            timeout = httpx.Timeout(
+                safe_float(os.getenv("OPENAI_TIMEOUT"), OPENAI_TIMEOUT),
+                connect=OPENAI_CONNECT_TIMEOUT,
+            )
+            _client = OpenAI(
+                api_key=api_key,
+                timeout=timeout,
+                http_client=httpx.Client(
+                    timeout=timeout,
+                    limits=httpx.Limits(
+                        # Headroom for retries that overlap a slow in-flight call.
+                        max_connections=pool_size * 2,
+                        max_keepalive_connections=pool_size,
+                        keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+                    ),
+                ),
+            )
+        return _client
+
+
+class RateLimiter:
+    """Sliding one-minute window over requests and tokens, shared by every
+    thread that calls the model.
+
+    ``acquire`` blocks until the call fits under both limits, reserving an
+    estimate of its tokens; ``settle`` replaces the estimate with the usage
+    the API reports.
+    """
+
+    def __init__(self, rpm: int, tpm: int, window: float = 60.0) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self._calls: Deque[List[float]] = deque()
+        self._tokens = 0.0
+        self._cond = threading.Condition()
+
+    def _expire(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] >= self.window:
+            self._tokens -= self._calls.popleft()[1]
+
+    def acquire(self, tokens: int) -> List[float]:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                over_rpm = self.rpm > 0 and len(self._calls) >= self.rpm
+                # A single call larger than the whole budget still goes through alone.
+                over_tpm = self.tpm > 0 and self._calls and self._tokens + tokens > self.tpm
+                if not over_rpm and not over_tpm:
+                    entry = [now, float(tokens)]
+                    self._calls.append(entry)
+                    self._tokens += tokens
+                    return entry
+                wait = self.window - (now - self._calls[0][0]) if self._calls else 0.05
+                self._cond.wait(max(0.05, wait))
+
+    def settle(self, entry: List[float], tokens: int) -> None:
+        with self._cond:
+            if entry in self._calls:
+                self._tokens += tokens - entry[1]
+            entry[1] = float(tokens)
+            self._cond.notify_all()
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(
+                safe_int(os.getenv("OPENAI_RPM"), OPENAI_RPM),
+                safe_int(os.getenv("OPENAI_TPM"), OPENAI_TPM),
+            )
+        return _rate_limiter
+
+
+def _create_completion(client: OpenAI, **kwargs):
+    """``chat.completions.create`` behind the shared rate limiter."""
+    prompt_chars = sum(len(message.get("content") or "") for message in kwargs.get("messages", []))
+    limiter = get_rate_limiter()
+    entry = limiter.acquire(prompt_chars // 4 + COMPLETION_TOKEN_ESTIMATE)
+    resp = client.chat.completions.create(**kwargs)
+    usage = getattr(resp, "usage", None)
+    if usage is not None and getattr(usage, "total_tokens", None):
+        limiter.settle(entry, usage.total_tokens)
+    return resp
 
 
 def _call_with_retry(fn, attempts: int = 4, base_delay: float = 1.0):
@@ -64,6 +180,76 @@ def _get_model() -> str:
     return os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
 
+def _normalize_category(value: object) -> str:
+    category = str(value or "").strip()
+    for known in CATEGORIES:
+        if category.lower() == known.lower():
+            return known
+    return "Other"
+
+
+def _normalize_tags(value: object) -> List[str]:
+    if isinstance(value, str):
+        value = [tag.strip() for tag in value.split(",") if tag.strip()]
+    if not isinstance(value, list):
+        return []
+    return [str(tag).strip() for tag in value if str(tag).strip()]
+
+
+def analyze_content(item: Dict[str, str], body_text: str) -> Dict[str, object]:
+    """Summary, category and topic tags from one JSON-mode call.
+
+    Returns ``summary_md``, ``category`` and ``topic_tags``. A field the model
+    left out or left empty is filled by its single-purpose call
+    (``summarize_content``, ``classify_category``, ``tag_topics``).
+    """
+    model = _get_model()
+    client = _get_client()
+    prompt = (
+        "Analyze the email and return a JSON object with exactly these keys:\n"
+        "\"summary\": a 2-4 sentence markdown summary focused on key facts and implications;\n"
+        "\"category\": ONE of: " + ", ".join(CATEGORIES) + ";\n"
+        "\"tags\": an array of 3-6 concise topic tags, including a domain tag from this list if relevant: "
+        + ", ".join(DOMAIN_TAGS)
+        + ".\n\n"
+        f"Subject: {item.get('subject')}\n"
+        f"From: {item.get('sender')}\n"
+        f"Date: {item.get('date')}\n"
+        f"Body:\n{body_text}\n"
+    )
+
+    def _call():
+        return _create_completion(
+            client,
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            response_format={"type": "json_object"},
+        )
+
+    resp = _call_with_retry(_call)
+    payload = _parse_json_response(resp.choices[0].message.content or "")
+    if not isinstance(payload, dict):
+        payload = {}
+
+    summary: Optional[str] = str(payload.get("summary") or payload.get("summary_md") or "").strip() or None
+    category: Optional[str] = None
+    if str(payload.get("category") or "").strip():
+        category = _normalize_category(payload["category"])
+    tags: Optional[List[str]] = None
+    raw_tags = payload.get("tags", payload.get("topic_tags"))
+    if raw_tags is not None:
+        tags = _normalize_tags(raw_tags)
+
+    if summary is None:
+        summary = summarize_content(item, body_text)
+    if category is None:
+        category = classify_category(item, body_text)
+    if tags is None:
+        tags = tag_topics(item, body_text)
+    return {"summary_md": summary, "category": category, "topic_tags": tags}
+
+
 def summarize_content(item: Dict[str, str], body_text: str) -> str:
     model = _get_model()
     client = _get_client()
@@ -77,7 +263,8 @@ def summarize_content(item: Dict[str, str], body_text: str) -> str:
     )
 
     def _call():
-        return client.chat.completions.create(
+        return _create_completion(
+            client,
             model=model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
@@ -101,7 +288,8 @@ def classify_category(item: Dict[str, str], body_text: str) -> str:
     )
 
     def _call():
-        return client.chat.completions.create(
+        return _create_completion(
+            client,
             model=model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.1,
@@ -140,7 +328,8 @@ def tag_topics(item: Dict[str, str], body_text: str) -> List[str]:
     )
 
     def _call():
-        return client.chat.completions.create(
+        return _create_completion(
+            client,
             model=model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
@@ -191,7 +380,8 @@ def generate_role_angles(
     )
 
     def _call():
-        return client.chat.completions.create(
+        return _create_completion(
+            client,
             model=model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.25,
@@ -219,3 +409,72 @@ def generate_role_angles(
         role_angle = f"Assess impact on {role.name} priorities and execution."
 
     return startup, role_angle
+
+
+def generate_multi_role_angles(
+    *,
+    item: Dict[str, str],
+    summary_md: str,
+    category: str,
+    topic_tags: List[str],
+    roles: List,
+) -> Dict[str, Tuple[str, str]]:
+    """``(startup_angle, role_angle)`` for several roles from one JSON-mode call.
+
+    A role missing from the response is generated with ``generate_role_angles``.
+    """
+    if len(roles) == 1:
+        role = roles[0]
+        return {
+            role.name: generate_role_angles(
+                item=item, summary_md=summary_md, category=category, topic_tags=topic_tags, role=role
+            )
+        }
+
+    model = _get_model()
+    client = _get_client()
+    tags = ", ".join(topic_tags) if topic_tags else "None"
+    role_lines = "\n".join(
+        f"- {role.name}: {'; '.join(role.objectives) if role.objectives else 'Provide actionable insights.'}"
+        for role in roles
+    )
+    prompt = (
+        "You are generating concise insights for role-based digests.\n"
+        f"Roles and their objectives:\n{role_lines}\n"
+        f"Category: {category}\n"
+        f"Topic tags: {tags}\n"
+        "Return a JSON object keyed by role name. Each value is an object with keys "
+        "\"startup_angle\" and \"role_angle\", one concise sentence each, written for that role.\n\n"
+        f"Subject: {item.get('subject')}\n"
+        f"Summary:\n{summary_md}\n"
+    )
+
+    def _call():
+        return _create_completion(
+            client,
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.25,
+            response_format={"type": "json_object"},
+        )
+
+    resp = _call_with_retry(_call)
+    payload = _parse_json_response(resp.choices[0].message.content or "")
+    if not isinstance(payload, dict):
+        payload = {}
+    by_name = {str(name).strip().lower(): value for name, value in payload.items()}
+
+    angles: Dict[str, Tuple[str, str]] = {}
+    for role in roles:
+        entry = by_name.get(role.name.lower())
+        startup = role_angle = ""
+        if isinstance(entry, dict):
+            startup = str(entry.get("startup_angle") or "").strip()
+            role_angle = str(entry.get("role_angle") or "").strip()
+        if startup and role_angle:
+            angles[role.name] = (startup, role_angle)
+        else:
+            angles[role.name] = generate_role_angles(
+                item=item, summary_md=summary_md, category=category, topic_tags=topic_tags, role=role
+            )
+    return angles
@@ -0,0 +1,93 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+from .store import get_sender_texts
+
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def line_key(line: str) -> Optional[bytes]:
+    """Hash a line after normalizing case, whitespace and numbers, so
+    "Issue #212 - Jan 3" and "Issue #213 - Jan 10" share a key."""
+    normalized = _SPACE_RE.sub(" ", _DIGITS_RE.sub("#", line.strip().lower()))
+    if not normalized:
+        return None
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+
+def learn_template(texts: Iterable[str], *, min_issues: int, min_share: float) -> Set[bytes]:
+    """Return the line keys that recur in at least ``min_share`` of the given
+    issues (and in at least ``min_issues`` of them)."""
+    counts: Dict[bytes, int] = {}
+    issues = 0
+    for text in texts:
+        issues += 1
+        for key in {line_key(line) for line in text.splitlines()}:
+            if key is not None:
+                counts[key] = counts.get(key, 0) + 1
+    if issues < min_issues:
+        return set()
+    threshold = max(min_issues, int(issues * min_share + 0.999))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def strip_template(text: str, template: Set[bytes]) -> str:
+    if not template or not text:
+        return text
+    kept: List[str] = [line for line in text.splitlines() if line_key(line) not in template]
+    stripped = "\n".join(kept).strip()
+    # A sender whose issues are identical would otherwise lose everything.
+    return stripped or text
+
+
+class BoilerplateLearner:
+    """Learns each sender's recurring header/footer/sponsor lines from their
+    recent stored items and strips them from prompt text.
+
+    Templates are learned once per sender per process and cached.
+    """
+
+    def __init__(self, *, history: int = 20, min_issues: int = 3, min_share: float = 0.6) -> None:
+        self.history = history
+        self.min_issues = min_issues
+        self.min_share = min_share
+        self._templates: Dict[str, Set[bytes]] = {}
+        self._lock = threading.Lock()
+
+    def template(self, conn: sqlite3.Connection, sender: str) -> Set[bytes]:
+        with self._lock:
+            cached = self._templates.get(sender)
+        if cached is not None:
+            return cached
+        template = learn_template(
+            get_sender_texts(conn, sender, limit=self.history),
+            min_issues=self.min_issues,
+            min_share=self.min_share,
+        )
+        with self._lock:
+            self._templates[sender] = template
+        return template
+
+    def strip(self, conn: sqlite3.Connection, item: Dict[str, str]) -> str:
+        text = item.get("extracted_text") or ""
+        sender = item.get("sender") or ""
+        if not sender or not text:
+            return text
+        return strip_template(text, self.template(conn, sender))
+
+
+def sender_savings(conn: sqlite3.Connection, learner: BoilerplateLearner, sender: str) -> Dict[str, int]:
+    """Characters before and after stripping across a sender's recent issues."""
+    template = learner.template(conn, sender)
+    texts = get_sender_texts(conn, sender, limit=learner.history)
+    return {
+        "issues": len(texts),
+        "template_lines": len(template),
+        "chars_before": sum(len(text) for text in texts),
+        "chars_after": sum(len(strip_template(text, template)) for text in texts),
+    }
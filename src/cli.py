@@ -1,12 +1,24 @@
 import argparse
+import time
 from datetime import datetime
 from typing import Optional
 
 from dotenv import load_dotenv
 
+from .boilerplate import sender_savings
 from .digest_writer import write_digest
-from .pipeline import build_digest_items, format_digest_markdown, ingest_emails
+from .domain_health import domain_report
+from .pipeline import (
+    build_digest_items,
+    enrich_content,
+    format_digest_markdown,
+    get_boilerplate_learner,
+    import_archives,
+    ingest_emails,
+    watch_emails,
+)
 from .roles import enabled_roles, get_role, load_roles
+from .store import get_connection, get_top_senders, init_db
 
 
 def _parse_args() -> argparse.Namespace:
@@ -15,6 +27,46 @@ def _parse_args() -> argparse.Namespace:
 
     ingest_parser = subparsers.add_parser("ingest", help="Ingest new emails into the store")
     ingest_parser.add_argument("--quiet", action="store_true", help="Less console output")
+    ingest_parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=None,
+        help="Fetch bodies in chunks and parse them concurrently with the download",
+    )
+    ingest_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Stay connected with IMAP IDLE and ingest new mail as it arrives",
+    )
+    ingest_parser.add_argument(
+        "--max-messages",
+        type=int,
+        default=None,
+        help="Stop cleanly after processing N message bodies",
+    )
+    ingest_parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        help="Stop cleanly after N seconds",
+    )
+
+    import_parser = subparsers.add_parser(
+        "import",
+        help="Import mbox files, Maildir trees or .eml folders into the store",
+    )
+    import_parser.add_argument("paths", nargs="+", help="mbox file, Maildir or directory of .eml files")
+    import_parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    import_parser.add_argument("--fetch-links", action="store_true", help="Also fetch linked article content for imported items")
+    import_parser.add_argument("--max-messages", type=int, default=None, help="Stop after N messages")
+
+    enrich_parser = subparsers.add_parser(
+        "enrich",
+        help="Fetch linked article content for stored items that have not been enriched yet",
+    )
+    enrich_parser.add_argument("--since-hours", type=int, default=None, help="Only enrich items since N hours")
+    enrich_parser.add_argument("--max-items", type=int, default=None, help="Maximum items to enrich")
+    enrich_parser.add_argument("--no-prompt", action="store_true", help="Never ask before fetching many links")
 
     digest_parser = subparsers.add_parser("build-digest", help="Build a role-based digest")
     digest_parser.add_argument("--role", type=str, help="Role name (e.g., CTO)")
@@ -24,6 +76,18 @@ def _parse_args() -> argparse.Namespace:
 
     subparsers.add_parser("list-roles", help="List configured roles")
 
+    boilerplate_parser = subparsers.add_parser(
+        "boilerplate-report",
+        help="Show how much recurring sender boilerplate is stripped from prompts",
+    )
+    boilerplate_parser.add_argument("--senders", type=int, default=20, help="Number of top senders to report")
+
+    domain_parser = subparsers.add_parser(
+        "domain-report",
+        help="Show which link domains cost the most fetch time and which are circuit-broken",
+    )
+    domain_parser.add_argument("--top", type=int, default=20, help="Number of domains to show")
+
     return parser.parse_args()
 
 
@@ -33,7 +97,12 @@ def _build_for_role(role_name: str, since_hours: Optional[int], max_items: Optio
     if not role:
         raise RuntimeError(f"Unknown role: {role_name}")
 
-    items = build_digest_items(role, since_hours=since_hours, max_items=max_items)
+    items = build_digest_items(
+        role,
+        since_hours=since_hours,
+        max_items=max_items,
+        roles=enabled_roles(roles),
+    )
     markdown = format_digest_markdown(items, role.name)
     out_path = write_digest(markdown, date=datetime.utcnow().date(), role=role.name)
     return out_path
@@ -44,11 +113,41 @@ def main() -> None:
     args = _parse_args()
 
     if args.command == "ingest":
-        new_count, skipped, _ = ingest_emails()
+        if args.watch:
+            watch_emails(stream=args.stream)
+            return
+        new_count, skipped, _ = ingest_emails(
+            stream=args.stream,
+            max_messages=args.max_messages,
+            time_budget=args.time_budget,
+        )
         if not args.quiet:
             print(f"Ingested: {new_count}, Skipped: {skipped}")
         return
 
+    if args.command == "import":
+        started = time.monotonic()
+        new_count, skipped, _ = import_archives(
+            args.paths,
+            workers=args.workers,
+            fetch_links=args.fetch_links,
+            max_messages=args.max_messages,
+        )
+        elapsed = time.monotonic() - started
+        total = new_count + skipped
+        rate = total / elapsed if elapsed > 0 else 0.0
+        print(f"Imported: {new_count}, Skipped: {skipped} ({total} messages in {elapsed:.1f}s, {rate:.0f}/s)")
+        return
+
+    if args.command == "enrich":
+        enriched = enrich_content(
+            since_hours=args.since_hours,
+            max_items=args.max_items,
+            interactive=False if args.no_prompt else None,
+        )
+        print(f"Enriched: {enriched}")
+        return
+
     if args.command == "list-roles":
         roles = load_roles()
         for role in roles.values():
@@ -56,6 +155,40 @@ def main() -> None:
             print(f"{role.name} ({status})")
         return
 
+    if args.command == "boilerplate-report":
+        learner = get_boilerplate_learner()
+        if learner is None:
+            print("Boilerplate stripping is disabled (BOILERPLATE_STRIP=false)")
+            return
+        conn = get_connection()
+        init_db(conn)
+        total_before = total_after = 0
+        for row in get_top_senders(conn, args.senders):
+            stats = sender_savings(conn, learner, row["sender"])
+            total_before += stats["chars_before"]
+            total_after += stats["chars_after"]
+            saved = 1 - stats["chars_after"] / stats["chars_before"] if stats["chars_before"] else 0.0
+            print(
+                f"{saved:6.1%}  {stats['template_lines']:4d} template lines  "
+                f"{stats['issues']:3d} issues  {row['sender'][:60]}"
+            )
+        if total_before:
+            print(f"Total: {1 - total_after / total_before:.1%} of body text stripped (~{(total_before - total_after) // 4} tokens)")
+        return
+
+    if args.command == "domain-report":
+        conn = get_connection()
+        init_db(conn)
+        now = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+        for row in domain_report(conn, args.top):
+            state = f"open until {row['open_until']}" if row["open_until"] and row["open_until"] > now else "closed"
+            avg = row["total_seconds"] / row["requests"] if row["requests"] else 0.0
+            print(
+                f"{row['total_seconds']:8.1f}s  {row['requests']:5d} req  avg {avg:5.2f}s  "
+                f"{row['failures']:4d} failed  {row['timeouts']:4d} timeouts  {state:<32} {row['domain']}"
+            )
+        return
+
     if args.command == "build-digest":
         if args.all_roles:
             roles = enabled_roles(load_roles())
@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+from .store import get_domain_health, upsert_domain_health
+
+
+FAILURE_THRESHOLD = 3
+COOLDOWN_MINUTES = 60
+
+
+def domain_of(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _utc_now() -> datetime:
+    return datetime.utcnow().replace(microsecond=0)
+
+
+def _is_domain_failure(error: Optional[str]) -> bool:
+    # A 404 is about one URL; timeouts, refused connections, 5xx and
+    # blocking responses (403/429) are about the site.
+    if not error:
+        return False
+    if error.startswith("http_"):
+        code = int(error[5:] or 0)
+        return code >= 500 or code in (403, 429)
+    return True
+
+
+class DomainHealth:
+    """Per-domain circuit breaker with wall-clock accounting.
+
+    After ``failure_threshold`` consecutive site-level failures the circuit
+    opens and the domain is skipped for ``cooldown``. Once the cooldown ends,
+    one request is let through: success closes the circuit, failure reopens
+    it. State is loaded from and flushed to the ``domain_health`` table, so
+    dead hosts stay skipped across runs.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, cooldown: timedelta = timedelta(minutes=COOLDOWN_MINUTES)) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._domains: Dict[str, Dict[str, Any]] = {}
+        self._dirty: Set[str] = set()
+        self._probing: Set[str] = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            for row in get_domain_health(conn):
+                self._domains.setdefault(row["domain"], row)
+            self._loaded = True
+
+    def _entry(self, domain: str) -> Dict[str, Any]:
+        entry = self._domains.get(domain)
+        if entry is None:
+            entry = self._domains[domain] = {
+                "domain": domain,
+                "requests": 0,
+                "failures": 0,
+                "timeouts": 0,
+                "consecutive_failures": 0,
+                "total_seconds": 0.0,
+                "open_until": None,
+                "last_error": None,
+            }
+        return entry
+
+    def allow(self, url: str) -> bool:
+        domain = domain_of(url)
+        with self._lock:
+            entry = self._domains.get(domain)
+            if not entry or not entry.get("open_until"):
+                return True
+            if entry["open_until"] > _utc_now().isoformat() + "Z":
+                return False
+            # Half-open: let a single probe through until it reports back.
+            if domain in self._probing:
+                return False
+            self._probing.add(domain)
+            return True
+
+    def release(self, url: str) -> None:
+        """Give up a half-open probe that never ran, so the next one can."""
+        with self._lock:
+            self._probing.discard(domain_of(url))
+
+    def record(self, url: str, *, seconds: float, error: Optional[str]) -> None:
+        domain = domain_of(url)
+        with self._lock:
+            self._probing.discard(domain)
+            entry = self._entry(domain)
+            entry["requests"] += 1
+            entry["total_seconds"] += seconds
+            if error == "timeout":
+                entry["timeouts"] += 1
+            if _is_domain_failure(error):
+                entry["failures"] += 1
+                entry["consecutive_failures"] += 1
+                entry["last_error"] = error
+                if entry["consecutive_failures"] >= self.failure_threshold:
+                    entry["open_until"] = (_utc_now() + self.cooldown).isoformat() + "Z"
+            else:
+                entry["consecutive_failures"] = 0
+                entry["open_until"] = None
+            self._dirty.add(domain)
+
+    def flush(self, conn: sqlite3.Connection, *, commit: bool = False) -> None:
+        with self._lock:
+            rows = [dict(self._domains[domain]) for domain in self._dirty]
+            self._dirty.clear()
+        if rows:
+            upsert_domain_health(conn, rows, commit=commit)
+
+
+def domain_report(conn: sqlite3.Connection, limit: int = 20) -> List[Dict[str, Any]]:
+    """Domains ordered by total wall-clock time spent fetching from them."""
+    return get_domain_health(conn)[:limit]
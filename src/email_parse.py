@@ -1,12 +1,85 @@
 import email
+import email.header
+import io
 from email.message import Message
-from typing import Dict, Optional
+import re
+from typing import Dict, List, Optional, Set, Tuple
 
-from bs4 import BeautifulSoup
+from lxml import etree
 
 
 PLAIN_TYPES = {"text/plain"}
 HTML_TYPES = {"text/html"}
+SKIP_TAGS = {"script", "style", "noscript", "head", "meta", "link"}
+
+_TEXT_URL_RE = re.compile(r"https?://[^\s<>\"{}|\\^`\[\]]+")
+_BOUNDARY_RE = re.compile(rb'boundary\s*=\s*(?:"([^"]+)"|([^\s;]+))', re.IGNORECASE)
+
+# Parse budgets; 0 disables a limit.
+MAX_PART_BYTES = 1_000_000
+MAX_MESSAGE_BYTES = 10_000_000
+MAX_TEXT_CHARS = 100_000
+
+
+def clip_message(raw: bytes, max_part_bytes: int = MAX_PART_BYTES, max_message_bytes: int = MAX_MESSAGE_BYTES) -> bytes:
+    """Return ``raw`` with every MIME part body cut to ``max_part_bytes`` and
+    the whole message cut to ``max_message_bytes``.
+
+    Headers and multipart boundaries are kept, so a huge inline image or
+    base64 HTML part is truncated without losing the parts that follow it.
+    Messages already under both budgets are returned unchanged.
+    """
+    if (not max_part_bytes or len(raw) <= max_part_bytes) and (
+        not max_message_bytes or len(raw) <= max_message_bytes
+    ):
+        return raw
+
+    out: List[bytes] = []
+    total = 0
+    boundaries: List[bytes] = []
+    headers: List[bytes] = []
+    in_headers = True
+    part_bytes = 0
+    for line in io.BytesIO(raw):
+        if max_message_bytes and total + len(line) > max_message_bytes:
+            break
+        if in_headers:
+            out.append(line)
+            total += len(line)
+            if line.strip():
+                headers.append(line)
+                continue
+            match = _BOUNDARY_RE.search(b"".join(headers))
+            if match:
+                boundaries.append(b"--" + (match.group(1) or match.group(2)))
+            headers = []
+            in_headers = False
+            part_bytes = 0
+            continue
+
+        if boundaries and line.startswith(b"--"):
+            marker = line.rstrip(b"\r\n")
+            index = next(
+                (i for i in range(len(boundaries) - 1, -1, -1) if marker in (boundaries[i], boundaries[i] + b"--")),
+                None,
+            )
+            if index is not None:
+                out.append(line)
+                total += len(line)
+                part_bytes = 0
+                if marker == boundaries[index]:
+                    del boundaries[index + 1 :]
+                    in_headers = True
+                else:
+                    del boundaries[index:]
+                continue
+
+        if max_part_bytes and part_bytes + len(line) > max_part_bytes:
+            continue
+        out.append(line)
+        total += len(line)
+        part_bytes += len(line)
+    return b"".join(out)
 
 
 def _decode_part(part: Message) -> str:
@@ -20,99 +93,183 @@ def _decode_part(part: Message) -> str:
         return payload.decode("utf-8", errors="replace")
 
 
-def _html_to_text(html: str) -> str:
+class _TextAndLinks:
+    """lxml parser target that renders visible text and collects URLs in one
+    pass, without building a tree.
+
+    Output matches the previous BeautifulSoup path: each text node becomes a
+    stripped line and an http(s) anchor becomes a single "text href" line.
+    """
+
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+        self.links: List[str] = []
+        self._seen_links: Set[str] = set()
+        self._buffer: List[str] = []
+        self._skip_depth = 0
+        self._anchor_href: Optional[str] = None
+        self._anchor_text: List[str] = []
+
+    def _add_link(self, url: str) -> None:
+        if url not in self._seen_links:
+            self._seen_links.add(url)
+            self.links.append(url)
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer = []
+        if self._skip_depth:
+            return
+        if self._anchor_href is not None:
+            stripped = text.strip()
+            if stripped:
+                self._anchor_text.append(stripped)
+            return
+        stripped = text.strip()
+        if stripped:
+            self.lines.append(stripped)
+            if "http" in stripped:
+                for url in _TEXT_URL_RE.findall(stripped):
+                    self._add_link(url)
+
+    def start(self, tag, attrib) -> None:
+        self._flush()
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if tag == "a" and self._anchor_href is None and not self._skip_depth:
+            href = (attrib.get("href") or "").strip()
+            if href.startswith(("http://", "https://")):
+                self._anchor_href = href
+                self._anchor_text = []
+
+    def end(self, tag) -> None:
+        self._flush()
+        if tag in SKIP_TAGS:
+            if self._skip_depth:
+                self._skip_depth -= 1
+            return
+        if tag == "a" and self._anchor_href is not None:
+            href = self._anchor_href
+            self._anchor_href = None
+            self.lines.append(f"{''.join(self._anchor_text)} {href}".strip())
+            self._add_link(href)
+
+    def data(self, text) -> None:
+        self._buffer.append(text)
+
+    def comment(self, text) -> None:
+        self._flush()
+
+    def close(self) -> Tuple[str, List[str]]:
+        self._flush()
+        if self._anchor_href is not None:
+            self.end("a")
+        lines = []
+        for line in "\n".join(self.lines).splitlines():
+            line = line.strip()
+            if line:
+                lines.append(line)
+        return "\n".join(lines), self.links
+
+
+def html_to_text_and_links(html: str) -> Tuple[str, List[str]]:
+    """Render HTML to text and return the ordered, de-duplicated URLs found
+    in anchors and visible text."""
     if not html or not html.strip():
-        return ""
-    
-    soup = BeautifulSoup(html, "lxml")
-    
-    # Convert links to text with URLs inline (not references)
-    for a_tag in soup.find_all('a', href=True):
-        href = a_tag.get('href', '')
-        text = a_tag.get_text(strip=True)
-        # Replace the link with text and URL inline
-        if href and href.startswith(('http://', 'https://')):
-            # Put URL inline to avoid losing it at the bottom
-            a_tag.replace_with(f"{text} {href} ")
-    
-    # Remove script, style, and other non-content tags
-    for tag in soup(["script", "style", "noscript", "head", "meta", "link"]):
-        tag.decompose()
-    
-    # Get text with better separator handling
-    text = soup.get_text(separator="\n", strip=True)
-    
-    # Clean up extra whitespace while preserving structure
-    lines = []
-    for line in text.splitlines():
-        line = line.strip()
-        if line:  # Only keep non-empty lines
-            lines.append(line)
-    
-    result = "\n".join(lines)
-    return result if result else ""
+        return "", []
+    target = _TextAndLinks()
+    parser = etree.HTMLParser(target=target)
+    parser.feed(html)
+    return parser.close()
 
 
-def _extract_body(msg: Message) -> str:
-    text_parts = []
-    html_parts = []
+def _html_to_text(html: str) -> str:
+    return html_to_text_and_links(html)[0]
 
-    if msg.is_multipart():
-        for part in msg.walk():
-            if part.get_content_maintype() == "multipart":
-                continue
-            ctype = part.get_content_type()
-            if ctype in PLAIN_TYPES:
-                decoded = _decode_part(part)
-                if decoded.strip():
-                    text_parts.append(decoded)
-            elif ctype in HTML_TYPES:
-                decoded = _decode_part(part)
-                if decoded.strip():
-                    html_parts.append(decoded)
-    else:
-        ctype = msg.get_content_type()
+
+def _extract_body(msg: Message, max_text_chars: int = 0) -> Tuple[str, Optional[List[str]]]:
+    """Return the body text, plus the links found while rendering HTML
+    (None when the body came from a text/plain part).
+
+    Once ``max_text_chars`` of a kind have been collected, later parts of that
+    kind are not decoded at all.
+    """
+    text_parts: List[str] = []
+    html_parts: List[str] = []
+    text_chars = 0
+    html_chars = 0
+
+    parts = msg.walk() if msg.is_multipart() else [msg]
+    for part in parts:
+        if part.get_content_maintype() == "multipart":
+            continue
+        ctype = part.get_content_type()
         if ctype in PLAIN_TYPES:
-            decoded = _decode_part(msg)
+            if max_text_chars and text_chars >= max_text_chars:
+                continue
+            decoded = _decode_part(part)
             if decoded.strip():
                 text_parts.append(decoded)
+                text_chars += len(decoded)
         elif ctype in HTML_TYPES:
-            decoded = _decode_part(msg)
+            if text_parts or (max_text_chars and html_chars >= max_text_chars):
+                # Plain text wins whenever present, so HTML is not needed.
+                continue
+            decoded = _decode_part(part)
             if decoded.strip():
                 html_parts.append(decoded)
+                html_chars += len(decoded)
 
     if text_parts:
-        body = "\n".join(text_parts)
-        return body.strip()
+        body = "\n".join(text_parts).strip()
+        return (body[:max_text_chars] if max_text_chars else body), None
     if html_parts:
         html_text = "\n".join(html_parts)
-        body = _html_to_text(html_text)
-        return body.strip()
-    return ""
+        body, links = html_to_text_and_links(html_text)
+        body = body.strip()
+        return (body[:max_text_chars] if max_text_chars else body), links
+    return "", None
+
+
+def decode_subject(subject_header: str) -> str:
+    if subject_header == "(no subject)":
+        return subject_header
+    # Decode email header (handles encoded-words like =?UTF-8?Q?...?=)
+    decoded_parts = email.header.decode_header(subject_header)
+    subject_parts = []
+    for content, charset in decoded_parts:
+        if isinstance(content, bytes):
+            try:
+                subject_parts.append(content.decode(charset or 'utf-8', errors='replace'))
+            except:
+                subject_parts.append(content.decode('utf-8', errors='replace'))
+        else:
+            subject_parts.append(content)
+    return ''.join(subject_parts)
+
 
+def parse_email(
+    raw: bytes,
+    max_body_chars: int = 4000,
+    *,
+    max_text_chars: int = MAX_TEXT_CHARS,
+    max_part_bytes: int = MAX_PART_BYTES,
+    max_message_bytes: int = MAX_MESSAGE_BYTES,
+) -> Optional[Dict[str, str]]:
+    """Parse a raw message within fixed budgets.
 
-def parse_email(raw: bytes, max_body_chars: int = 4000) -> Optional[Dict[str, str]]:
-    msg = email.message_from_bytes(raw)
+    ``max_part_bytes``/``max_message_bytes`` bound what the MIME parser sees
+    (see ``clip_message``) and ``max_text_chars`` bounds the decoded text kept
+    in ``full_body``. Pass 0 to disable a budget.
+    """
+    msg = email.message_from_bytes(clip_message(raw, max_part_bytes, max_message_bytes))
     
-    # Properly decode the subject with email header decoding
-    subject_header = msg.get("Subject", "(no subject)")
-    if subject_header != "(no subject)":
-        # Decode email header (handles encoded-words like =?UTF-8?Q?...?=)
-        decoded_parts = email.header.decode_header(subject_header)
-        subject_parts = []
-        for content, charset in decoded_parts:
-            if isinstance(content, bytes):
-                try:
-                    subject_parts.append(content.decode(charset or 'utf-8', errors='replace'))
-                except:
-                    subject_parts.append(content.decode('utf-8', errors='replace'))
-            else:
-                subject_parts.append(content)
-        subject = ''.join(subject_parts)
-    else:
-        subject = "(no subject)"
+    subject = decode_subject(msg.get("Subject", "(no subject)"))
     
-    body = _extract_body(msg)
+    body, links = _extract_body(msg, max_text_chars)
     
     # Debug: log parsing issues
     if not body:
@@ -133,7 +290,7 @@ def parse_email(raw: bytes, max_body_chars: int = 4000) -> Optional[Dict[str, st
     if len(body) > max_body_chars:
         body = body[: max_body_chars - 3] + "..."
 
-    return {
+    parsed = {
         "subject": subject,
         "from": msg.get("From", ""),
         "date": msg.get("Date", ""),
@@ -141,6 +298,10 @@ def parse_email(raw: bytes, max_body_chars: int = 4000) -> Optional[Dict[str, st
         "full_body": full_body,  # Keep full body for link extraction
         "list_unsubscribe": msg.get("List-Unsubscribe", ""),
     }
+    if links is not None:
+        # Collected while rendering the HTML, so no second regex pass is needed.
+        parsed["links"] = links
+    return parsed
 
 
 def is_newsletter(parsed: Dict[str, str]) -> bool:
@@ -0,0 +1,427 @@
+"""Local IMAP stand-in serving a synthetic newsletter mailbox.
+
+Implements the subset of IMAP4rev1 that ImapSession uses (LOGIN, ENABLE,
+SELECT/EXAMINE, UID SEARCH/FETCH/STORE, NOOP, IDLE) over plain TCP, with a
+configurable per-command delay to model round-trip time::
+
+    python -m src.fake_imap --messages 5000 --latency-ms 40 --port 1143
+    IMAP_HOST=127.0.0.1 IMAP_PORT=1143 IMAP_TLS=false python -m src.cli ingest
+"""
+
+import argparse
+import email
+import re
+import select
+import socket
+import socketserver
+import threading
+import time
+from email.message import EmailMessage, Message
+from email.policy import SMTP
+from functools import lru_cache
+from typing import Callable, List, Optional, Set, Tuple
+
+
+CAPABILITIES = "IMAP4rev1 IDLE ENABLE CONDSTORE UIDPLUS"
+SENDERS = [
+    ("TLDR", "dan@tldrnewsletter.com"),
+    ("Hacker Newsletter", "kale@hackernewsletter.com"),
+    ("Vendor Weekly", "news@vendor.example"),
+    ("Alice", "alice@example.org"),
+]
+
+_FETCH_ITEM_RE = re.compile(r"BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?|BODYSTRUCTURE|UID|FLAGS", re.I)
+
+
+def synthetic_message(uid: int, *, stories: int = 12, attachment_every: int = 5) -> bytes:
+    """Build a deterministic newsletter-like message for ``uid``."""
+    name, address = SENDERS[uid % len(SENDERS)]
+    is_newsletter = address != "alice@example.org"
+    msg = EmailMessage()
+    msg["Subject"] = f"{name} Daily #{uid}" if is_newsletter else f"Lunch on {uid}?"
+    msg["From"] = f"{name} <{address}>"
+    msg["To"] = "reader@example.com"
+    msg["Date"] = time.strftime("%a, %d %b %Y %H:%M:%S +0000", time.gmtime(1_700_000_000 + uid * 3600))
+    msg["Message-ID"] = f"<synthetic-{uid}@fake-imap.local>"
+    if is_newsletter:
+        msg["List-ID"] = f"<{name.lower().replace(' ', '-')}.list.example>"
+        msg["List-Unsubscribe"] = f"<https://{address.split('@')[1]}/unsubscribe?u={uid}>"
+
+    plain: List[str] = []
+    html: List[str] = ["<html><body><h1>Today's stories</h1>"]
+    for index in range(stories if is_newsletter else 1):
+        url = f"https://news.example.com/{uid}/story-{index}?utm_source=newsletter"
+        title = f"Story {index} for issue {uid}"
+        text = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 6
+        plain.append(f"{title}\n{url}\n{text}\n")
+        html.append(f'<h3><a href="{url}">{title}</a></h3><p>{text}</p>')
+    html.append('<p><a href="https://advertise.example.com/">Advertise</a></p></body></html>')
+
+    msg.set_content("\n".join(plain))
+    msg.add_alternative("\n".join(html), subtype="html")
+    if attachment_every and uid % attachment_every == 0:
+        msg.make_mixed()
+        msg.add_attachment(
+            bytes(range(256)) * 512,
+            maintype="application",
+            subtype="pdf",
+            filename=f"issue-{uid}.pdf",
+        )
+    return msg.as_bytes(policy=SMTP)
+
+
+def _quote(value: Optional[str]) -> str:
+    if value is None:
+        return "NIL"
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _params(part: Message) -> str:
+    params = [(k, v) for k, v in part.get_params(header="content-type")[1:]]
+    if not params:
+        return "NIL"
+    return "(" + " ".join(f"{_quote(k.upper())} {_quote(str(v))}" for k, v in params) + ")"
+
+
+def _bodystructure(part: Message) -> str:
+    if part.is_multipart():
+        children = "".join(_bodystructure(child) for child in part.get_payload())
+        return f"({children} {_quote(part.get_content_subtype().upper())} {_params(part)} NIL NIL NIL)"
+    raw = _section_bytes(part)
+    encoding = (part.get("Content-Transfer-Encoding") or "7bit").upper()
+    disposition = "NIL"
+    if part.get_content_disposition():
+        filename = part.get_filename()
+        extra = f"({_quote('FILENAME')} {_quote(filename)})" if filename else "NIL"
+        disposition = f"({_quote(part.get_content_disposition().upper())} {extra})"
+    fields = [
+        _quote(part.get_content_maintype().upper()),
+        _quote(part.get_content_subtype().upper()),
+        _params(part),
+        "NIL",
+        "NIL",
+        _quote(encoding),
+        str(len(raw)),
+    ]
+    if part.get_content_maintype() == "text":
+        fields.append(str(raw.count(b"\n") + 1))
+    fields.extend(["NIL", disposition, "NIL", "NIL"])
+    return "(" + " ".join(fields) + ")"
+
+
+def _section_bytes(part: Message) -> bytes:
+    payload = part.get_payload()
+    if isinstance(payload, str):
+        return payload.encode("ascii", errors="replace")
+    return b""
+
+
+def _find_section(msg: Message, section: str) -> Optional[Message]:
+    node = msg
+    for index in section.split("."):
+        if not node.is_multipart():
+            return node if index == "1" else None
+        children = node.get_payload()
+        position = int(index) - 1
+        if position < 0 or position >= len(children):
+            return None
+        node = children[position]
+    return node
+
+
+def _header_fields(raw: bytes, names: List[str]) -> bytes:
+    head = raw.split(b"\r\n\r\n", 1)[0]
+    wanted = {name.lower() for name in names}
+    lines: List[bytes] = []
+    keep = False
+    for line in head.split(b"\r\n"):
+        if line[:1] in (b" ", b"\t"):
+            if keep:
+                lines.append(line)
+            continue
+        keep = line.split(b":", 1)[0].decode("latin-1").lower() in wanted
+        if keep:
+            lines.append(line)
+    return b"\r\n".join(lines) + b"\r\n\r\n"
+
+
+class SyntheticMailbox:
+    def __init__(self, messages: int, *, uidvalidity: int = 1, first_uid: int = 1) -> None:
+        self.uidvalidity = uidvalidity
+        self._lock = threading.Lock()
+        self.uids: List[int] = list(range(first_uid, first_uid + messages))
+        self.seen: Set[int] = set()
+        self.modseq = 1
+
+    def append(self, count: int = 1) -> None:
+        with self._lock:
+            start = (self.uids[-1] + 1) if self.uids else 1
+            self.uids.extend(range(start, start + count))
+            self.modseq += 1
+
+    def mark_seen(self, uids: List[int]) -> None:
+        with self._lock:
+            self.seen.update(uids)
+            self.modseq += 1
+
+    @property
+    def uidnext(self) -> int:
+        return (self.uids[-1] + 1) if self.uids else 1
+
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def raw(uid: int) -> bytes:
+        return synthetic_message(uid)
+
+
+def _parse_uid_set(spec: str, highest: int) -> Callable[[int], bool]:
+    ranges: List[Tuple[int, int]] = []
+    for piece in spec.split(","):
+        if ":" in piece:
+            low, high = piece.split(":", 1)
+            a = highest if low == "*" else int(low)
+            b = highest if high == "*" else int(high)
+            ranges.append((min(a, b), max(a, b)))
+        else:
+            value = highest if piece == "*" else int(piece)
+            ranges.append((value, value))
+    return lambda uid: any(low <= uid <= high for low, high in ranges)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "FakeImapServer"
+
+    def _send(self, data: bytes) -> None:
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def _line(self, text: str) -> None:
+        self._send(text.encode("utf-8") + b"\r\n")
+
+    def setup(self) -> None:
+        super().setup()
+        # Many small response lines would otherwise stall on Nagle/delayed ACK
+        # and swamp the configured latency.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self) -> None:
+        self._line("* OK fake IMAP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode("utf-8", errors="replace").strip().split(" ", 2)
+            if len(parts) < 2:
+                continue
+            tag, command = parts[0], parts[1].upper()
+            args = parts[2] if len(parts) > 2 else ""
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            if command == "LOGOUT":
+                self._line("* BYE logging out")
+                self._line(f"{tag} OK LOGOUT completed")
+                return
+            handler = getattr(self, f"_cmd_{command.lower()}", None)
+            if handler is None:
+                self._line(f"{tag} BAD unsupported command {command}")
+                continue
+            handler(tag, args)
+
+    def _cmd_capability(self, tag: str, args: str) -> None:
+        self._line(f"* CAPABILITY {CAPABILITIES}")
+        self._line(f"{tag} OK CAPABILITY completed")
+
+    def _cmd_login(self, tag: str, args: str) -> None:
+        self._line(f"{tag} OK [CAPABILITY {CAPABILITIES}] LOGIN completed")
+
+    def _cmd_enable(self, tag: str, args: str) -> None:
+        self._line(f"* ENABLED {args.upper()}")
+        self._line(f"{tag} OK ENABLE completed")
+
+    def _cmd_noop(self, tag: str, args: str) -> None:
+        self._line(f"{tag} OK NOOP completed")
+
+    def _cmd_close(self, tag: str, args: str) -> None:
+        self._line(f"{tag} OK CLOSE completed")
+
+    def _cmd_select(self, tag: str, args: str) -> None:
+        box = self.server.mailbox
+        self._line(f"* {len(box.uids)} EXISTS")
+        self._line("* 0 RECENT")
+        self._line("* FLAGS (\\Seen)")
+        self._line(f"* OK [UIDVALIDITY {box.uidvalidity}] UIDs valid")
+        self._line(f"* OK [UIDNEXT {box.uidnext}] Predicted next UID")
+        self._line(f"* OK [HIGHESTMODSEQ {box.modseq}] Highest")
+        self._line(f"{tag} OK [READ-WRITE] SELECT completed")
+
+    _cmd_examine = _cmd_select
+
+    def _cmd_idle(self, tag: str, args: str) -> None:
+        box = self.server.mailbox
+        known = len(box.uids)
+        self._line("+ idling")
+        while True:
+            if len(box.uids) > known:
+                known = len(box.uids)
+                self._line(f"* {known} EXISTS")
+            ready, _, _ = select.select([self.connection], [], [], 0.2)
+            if ready:
+                done = self.rfile.readline()
+                if not done or done.strip().upper() == b"DONE":
+                    break
+        self._line(f"{tag} OK IDLE terminated")
+
+    def _cmd_uid(self, tag: str, args: str) -> None:
+        sub, _, rest = args.partition(" ")
+        sub = sub.upper()
+        if sub == "SEARCH":
+            self._uid_search(tag, rest)
+        elif sub == "FETCH":
+            self._uid_fetch(tag, rest)
+        elif sub == "STORE":
+            uid_spec = rest.split(" ", 1)[0]
+            box = self.server.mailbox
+            highest = box.uids[-1] if box.uids else 0
+            matcher = _parse_uid_set(uid_spec, highest)
+            box.mark_seen([uid for uid in box.uids if matcher(uid)])
+            self._line(f"{tag} OK STORE completed")
+        else:
+            self._line(f"{tag} BAD unsupported UID {sub}")
+
+    def _uid_search(self, tag: str, criteria: str) -> None:
+        box = self.server.mailbox
+        highest = box.uids[-1] if box.uids else 0
+        tokens = criteria.upper().split()
+        matchers: List[Callable[[int], bool]] = []
+        for index, token in enumerate(tokens):
+            if token == "UID" and index + 1 < len(tokens):
+                matchers.append(_parse_uid_set(tokens[index + 1], highest))
+            elif token == "UNSEEN":
+                matchers.append(lambda uid: uid not in box.seen)
+        found = [str(uid) for uid in box.uids if all(m(uid) for m in matchers)]
+        self._line("* SEARCH" + ("" if not found else " " + " ".join(found)))
+        self._line(f"{tag} OK SEARCH completed")
+
+    def _uid_fetch(self, tag: str, rest: str) -> None:
+        uid_spec, _, items = rest.partition(" ")
+        box = self.server.mailbox
+        highest = box.uids[-1] if box.uids else 0
+        matcher = _parse_uid_set(uid_spec, highest)
+        requested = list(_FETCH_ITEM_RE.finditer(items))
+        for seq, uid in enumerate(box.uids, 1):
+            if not matcher(uid):
+                continue
+            raw = box.raw(uid)
+            out: List[bytes] = [f"* {seq} FETCH (UID {uid}".encode("ascii")]
+            parsed: Optional[Message] = None
+            for match in requested:
+                token = match.group(0).upper()
+                if token in ("UID", "FLAGS"):
+                    if token == "FLAGS":
+                        out.append(b" FLAGS (" + (b"\\Seen" if uid in box.seen else b"") + b")")
+                    continue
+                if token == "BODYSTRUCTURE":
+                    parsed = parsed or _parse(raw)
+                    out.append(b" BODYSTRUCTURE " + _bodystructure(parsed).encode("utf-8"))
+                    continue
+                section, origin, length = match.group(1), match.group(2), match.group(3)
+                data = self._section(raw, section, parsed)
+                label = f"BODY[{section}]"
+                if origin is not None:
+                    data = data[int(origin) : int(origin) + int(length)]
+                    label += f"<{origin}>"
+                out.append(f" {label} {{{len(data)}}}\r\n".encode("utf-8") + data)
+            out.append(b")\r\n")
+            self._send(b"".join(out))
+        self._line(f"{tag} OK FETCH completed")
+
+    @staticmethod
+    def _section(raw: bytes, section: str, parsed: Optional[Message]) -> bytes:
+        upper = section.upper()
+        if upper == "":
+            return raw
+        if upper.startswith("HEADER.FIELDS"):
+            names = re.findall(r"[\w-]+", section[section.find("(") :])
+            return _header_fields(raw, names)
+        if upper == "HEADER":
+            return raw.split(b"\r\n\r\n", 1)[0] + b"\r\n\r\n"
+        if upper == "TEXT":
+            return raw.split(b"\r\n\r\n", 1)[-1]
+        part = _find_section(parsed or _parse(raw), section)
+        return _section_bytes(part) if part is not None else b""
+
+
+def _parse(raw: bytes) -> Message:
+    return email.message_from_bytes(raw)
+
+
+class FakeImapServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        mailbox: SyntheticMailbox,
+        latency: float = 0.0,
+    ) -> None:
+        self.mailbox = mailbox
+        self.latency = latency
+        super().__init__(address, _Handler)
+
+
+def start_server(
+    messages: int = 1000,
+    *,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency_ms: float = 0.0,
+    uidvalidity: int = 1,
+) -> FakeImapServer:
+    """Start a server on a background thread; ``port=0`` picks a free port."""
+    server = FakeImapServer(
+        (host, port),
+        SyntheticMailbox(messages, uidvalidity=uidvalidity),
+        latency=latency_ms / 1000.0,
+    )
+    thread = threading.Thread(target=server.serve_forever, name="fake-imap", daemon=True)
+    thread.start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a synthetic mailbox over IMAP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--messages", type=int, default=1000, help="Initial mailbox size")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay per command")
+    parser.add_argument("--uidvalidity", type=int, default=1)
+    parser.add_argument(
+        "--arrival-interval",
+        type=float,
+        default=0.0,
+        help="Append a new message every N seconds (exercises ingest --watch)",
+    )
+    args = parser.parse_args()
+
+    server = start_server(
+        args.messages,
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        uidvalidity=args.uidvalidity,
+    )
+    print(f"Fake IMAP serving {args.messages} messages on {args.host}:{args.port} (plain TCP)")
+    try:
+        while True:
+            if args.arrival_interval > 0:
+                time.sleep(args.arrival_interval)
+                server.mailbox.append()
+            else:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
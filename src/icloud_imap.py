@@ -1,7 +1,36 @@
 import email
 import imaplib
 import os
-from typing import List, Optional
+import re
+import select
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .accounts import MailAccount
+from .imap_structure import (
+    TextPart,
+    build_text_message,
+    parse_bodystructures,
+    parse_section_response,
+    text_parts,
+)
+
+
+DEFAULT_HOST = "imap.mail.me.com"
+DEFAULT_PORT = 993
+HEADER_FIELDS = "MESSAGE-ID SUBJECT FROM DATE LIST-ID LIST-UNSUBSCRIBE"
+FETCH_CHUNK_SIZE = 250
+BODY_CHUNK_SIZE = 25
+MAX_PART_BYTES = 1_000_000
+# RFC 2177: clients should re-issue IDLE at least every 29 minutes.
+IDLE_TIMEOUT = 25 * 60
+
+_UID_RE = re.compile(rb"UID (\d+)")
+_IDLE_EVENT_RE = re.compile(rb"^\* \d+ (EXISTS|RECENT)")
 
 
 def _get_env(name: str) -> str:
@@ -11,6 +40,24 @@ def _get_env(name: str) -> str:
     return value
 
 
+def connect(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    use_tls: Optional[bool] = None,
+) -> imaplib.IMAP4:
+    """Open an IMAP connection; unset values come from IMAP_HOST, IMAP_PORT
+    and IMAP_TLS, defaulting to iCloud over TLS."""
+    if use_tls is None:
+        use_tls = os.getenv("IMAP_TLS", "true").strip().lower() in {"1", "true", "yes", "y"}
+    host = host or os.getenv("IMAP_HOST") or DEFAULT_HOST
+    if port is None:
+        env_port = os.getenv("IMAP_PORT")
+        port = int(env_port) if env_port else (DEFAULT_PORT if use_tls else 143)
+    if use_tls:
+        return imaplib.IMAP4_SSL(host, port)
+    return imaplib.IMAP4(host, port)
+
+
 def _extract_raw_message(msg_data) -> Optional[bytes]:
     raw = None
     for item in msg_data:
@@ -22,28 +69,233 @@ def _extract_raw_message(msg_data) -> Optional[bytes]:
     return raw
 
 
+def _format_uid_set(uids: Iterable[int]) -> str:
+    ordered = sorted(set(uids))
+    if not ordered:
+        return ""
+    ranges: List[str] = []
+    start = prev = ordered[0]
+    for uid in ordered[1:]:
+        if uid == prev + 1:
+            prev = uid
+            continue
+        ranges.append(str(start) if start == prev else f"{start}:{prev}")
+        start = prev = uid
+    ranges.append(str(start) if start == prev else f"{start}:{prev}")
+    return ",".join(ranges)
+
+
+def _chunked(uids: List[int], size: int) -> Iterable[List[int]]:
+    for i in range(0, len(uids), size):
+        yield uids[i : i + size]
+
+
+def _extract_uid_map(msg_data) -> Dict[int, bytes]:
+    """Map UID -> literal payload for a multi-message UID FETCH response.
+
+    Servers may report the UID before or after the literal, so the trailing
+    bytes item following a tuple is checked when the prefix lacks it.
+    """
+    results: Dict[int, bytes] = {}
+    items = list(msg_data or [])
+    for index, item in enumerate(items):
+        if not isinstance(item, tuple) or len(item) < 2:
+            continue
+        prefix, payload = item[0], item[1]
+        match = _UID_RE.search(prefix) if isinstance(prefix, bytes) else None
+        if not match and index + 1 < len(items) and isinstance(items[index + 1], bytes):
+            match = _UID_RE.search(items[index + 1])
+        if match and isinstance(payload, bytes):
+            results[int(match.group(1))] = payload
+    return results
+
+
+@dataclass
+class MailboxState:
+    uidvalidity: Optional[int] = None
+    uidnext: Optional[int] = None
+    highestmodseq: Optional[int] = None
+
+
+def _response_int(client: imaplib.IMAP4, code: str) -> Optional[int]:
+    _, data = client.response(code)
+    for value in reversed(data or []):
+        if isinstance(value, bytes) and value.strip().isdigit():
+            return int(value.strip())
+    return None
+
+
+def _has_buffered_input(client: imaplib.IMAP4) -> bool:
+    """Peek without blocking for bytes already read off the socket."""
+    sock = client.sock
+    previous = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        return bool(client.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        sock.settimeout(previous)
+
+
 class ImapSession:
-    def __init__(self, mailbox: str = "INBOX", mark_seen: bool = False) -> None:
+    def __init__(
+        self,
+        mailbox: str = "INBOX",
+        mark_seen: bool = False,
+        *,
+        user_env: str = "IMAP_USER",
+        password_env: str = "IMAP_PASSWORD",
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        use_tls: Optional[bool] = None,
+        text_parts_only: bool = False,
+        max_part_bytes: int = MAX_PART_BYTES,
+    ) -> None:
         self.mailbox = mailbox
         self.mark_seen = mark_seen
-        self.client: Optional[imaplib.IMAP4_SSL] = None
+        self.user_env = user_env
+        self.password_env = password_env
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.text_parts_only = text_parts_only
+        self.max_part_bytes = max_part_bytes
+        self.client: Optional[imaplib.IMAP4] = None
+        self._selected: Optional[str] = None
+        self._state: Optional[MailboxState] = None
+        # Set when a command may still be running on another thread; the
+        # socket is then dropped rather than reused or logged out of.
+        self.broken = False
 
-    def __enter__(self) -> "ImapSession":
-        user = _get_env("IMAP_USER")
-        password = _get_env("IMAP_PASSWORD")
-        self.client = imaplib.IMAP4_SSL("imap.mail.me.com", 993)
+    def open(self) -> "ImapSession":
+        user = _get_env(self.user_env)
+        password = _get_env(self.password_env)
+        self.client = connect(self.host, self.port, self.use_tls)
         self.client.login(user, password)
-        self.client.select(self.mailbox, readonly=not self.mark_seen)
+        try:
+            # Makes SELECT report HIGHESTMODSEQ on CONDSTORE servers.
+            self.client.enable("CONDSTORE")
+        except imaplib.IMAP4.error:
+            pass
         return self
 
-    def __exit__(self, exc_type, exc, tb) -> None:
+    def select(self, mailbox: str) -> None:
+        if not self.client:
+            raise RuntimeError("IMAP session not initialized")
+        if self._selected is not None:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+        status, data = self.client.select(mailbox, readonly=not self.mark_seen)
+        if status != "OK":
+            self._selected = None
+            raise RuntimeError(f"Cannot select mailbox {mailbox}: {data}")
+        self.mailbox = mailbox
+        self._selected = mailbox
+        self._state = MailboxState(
+            uidvalidity=_response_int(self.client, "UIDVALIDITY"),
+            uidnext=_response_int(self.client, "UIDNEXT"),
+            highestmodseq=_response_int(self.client, "HIGHESTMODSEQ"),
+        )
+
+    def take_mailbox_state(self) -> MailboxState:
+        """Return the state reported by the last SELECT.
+
+        UIDNEXT and HIGHESTMODSEQ are only current right after SELECT, so they
+        are handed out once; later calls (e.g. after IDLE) keep UIDVALIDITY
+        only, which forces a normal UID search.
+        """
+        state = self._state or MailboxState()
+        self._state = MailboxState(uidvalidity=state.uidvalidity)
+        return state
+
+    def close(self) -> None:
         if not self.client:
             return
+        if self.broken:
+            try:
+                self.client.shutdown()
+            except Exception:
+                pass
+            self.client = None
+            self._selected = None
+            return
+        try:
+            if self._selected is not None:
+                self.client.close()
+        except Exception:
+            pass
         try:
-            self.client.close()
+            self.client.logout()
         except Exception:
             pass
-        self.client.logout()
+        self.client = None
+        self._selected = None
+
+    def __enter__(self) -> "ImapSession":
+        self.open()
+        self.select(self.mailbox)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def idle(self, timeout: float = IDLE_TIMEOUT) -> bool:
+        """Wait in IMAP IDLE until new mail arrives or ``timeout`` elapses.
+
+        Returns True if the server reported new messages. Connection loss
+        surfaces as ``imaplib.IMAP4.abort`` so callers can reconnect.
+        imaplib before 3.14 has no IDLE, so the exchange is driven directly
+        and readiness is polled with select() rather than socket timeouts,
+        which would leave imaplib's buffered socket file unusable.
+        """
+        client = self.client
+        if not client:
+            raise RuntimeError("IMAP session not initialized")
+        tag = client._new_tag()
+        client.send(tag + b" IDLE\r\n")
+        line = client.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+
+        changed = False
+        deadline = time.monotonic() + timeout
+        sock = client.sock
+        while not changed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not _has_buffered_input(client):
+                ready, _, _ = select.select([sock], [], [], min(remaining, 60.0))
+                if not ready:
+                    continue
+            line = client.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+            if line.startswith(b"* BYE"):
+                raise imaplib.IMAP4.abort(line.decode("latin-1", "replace").strip())
+            if _IDLE_EVENT_RE.match(line):
+                changed = True
+
+        client.send(b"DONE\r\n")
+        while True:
+            line = client.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed while ending IDLE")
+            if line.startswith(tag):
+                if not line[len(tag) :].strip().upper().startswith(b"OK"):
+                    raise imaplib.IMAP4.error(f"IDLE failed: {line!r}")
+                break
+            if _IDLE_EVENT_RE.match(line):
+                changed = True
+        return changed
+
+    def noop(self) -> None:
+        if not self.client:
+            raise RuntimeError("IMAP session not initialized")
+        self.client.noop()
 
     def uid_search(self, query: str) -> List[int]:
         if not self.client:
@@ -56,29 +308,137 @@ class ImapSession:
     def fetch_headers(self, uid: int) -> Optional[bytes]:
         if not self.client:
             raise RuntimeError("IMAP session not initialized")
-        fields = "MESSAGE-ID SUBJECT FROM DATE LIST-ID LIST-UNSUBSCRIBE"
         status, msg_data = self.client.uid(
             "FETCH",
             str(uid),
-            f"(BODY.PEEK[HEADER.FIELDS ({fields})])",
+            f"(BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])",
         )
         if status != "OK" or not msg_data:
             return None
         return _extract_raw_message(msg_data)
 
+    def fetch_headers_batch(
+        self,
+        uids: List[int],
+        chunk_size: int = FETCH_CHUNK_SIZE,
+    ) -> Dict[int, bytes]:
+        """Fetch dedupe headers for many UIDs with one UID FETCH per chunk."""
+        if not self.client:
+            raise RuntimeError("IMAP session not initialized")
+        headers: Dict[int, bytes] = {}
+        for chunk in _chunked(sorted(set(uids)), max(1, chunk_size)):
+            status, msg_data = self.client.uid(
+                "FETCH",
+                _format_uid_set(chunk),
+                f"(UID BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])",
+            )
+            if status != "OK" or not msg_data:
+                continue
+            headers.update(_extract_uid_map(msg_data))
+        return headers
+
     def fetch_body(self, uid: int) -> Optional[bytes]:
         if not self.client:
             raise RuntimeError("IMAP session not initialized")
+        if self.text_parts_only:
+            return self.fetch_text_bodies([uid]).get(uid)
         status, msg_data = self.client.uid("FETCH", str(uid), "(BODY.PEEK[])")
         if status != "OK" or not msg_data:
             return None
         return _extract_raw_message(msg_data)
 
+    def iter_bodies(
+        self,
+        uids: List[int],
+        chunk_size: int = BODY_CHUNK_SIZE,
+    ) -> Iterator[List[Tuple[int, Optional[bytes]]]]:
+        """Yield full bodies in UID order, one multi-UID FETCH per chunk."""
+        if not self.client:
+            raise RuntimeError("IMAP session not initialized")
+        for chunk in _chunked(list(uids), max(1, chunk_size)):
+            if self.text_parts_only:
+                bodies = self.fetch_text_bodies(chunk)
+            else:
+                bodies = self._fetch_full_bodies(chunk)
+            yield [(uid, bodies.get(uid)) for uid in chunk]
+
+    def _fetch_full_bodies(self, uids: List[int]) -> Dict[int, bytes]:
+        if not self.client or not uids:
+            return {}
+        status, msg_data = self.client.uid("FETCH", _format_uid_set(uids), "(UID BODY.PEEK[])")
+        if status != "OK" or not msg_data:
+            return {}
+        return _extract_uid_map(msg_data)
+
+    def fetch_text_bodies(self, uids: List[int]) -> Dict[int, bytes]:
+        """Download only the inline text/plain and text/html sections.
+
+        BODYSTRUCTURE is read first; UIDs sharing a section layout are fetched
+        together with a partial fetch capped at ``max_part_bytes`` per part.
+        The result is a synthetic MIME message that ``parse_email`` accepts.
+        UIDs whose structure cannot be read fall back to ``BODY.PEEK[]``.
+        """
+        if not self.client:
+            raise RuntimeError("IMAP session not initialized")
+        if not uids:
+            return {}
+        status, msg_data = self.client.uid("FETCH", _format_uid_set(uids), "(UID BODYSTRUCTURE)")
+        structures = parse_bodystructures(msg_data) if status == "OK" and msg_data else {}
+
+        parts_by_uid: Dict[int, List[TextPart]] = {}
+        layouts: Dict[Tuple[str, ...], List[int]] = {}
+        fallback: List[int] = []
+        for uid in uids:
+            structure = structures.get(uid)
+            if structure is None:
+                fallback.append(uid)
+                continue
+            parts = text_parts(structure)
+            parts_by_uid[uid] = parts
+            layouts.setdefault(tuple(part.section for part in parts), []).append(uid)
+
+        bodies: Dict[int, bytes] = {}
+        cap = max(1, self.max_part_bytes)
+        for sections, group in layouts.items():
+            items = [f"BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})]"]
+            items.extend(f"BODY.PEEK[{section}]<0.{cap}>" for section in sections)
+            status, msg_data = self.client.uid(
+                "FETCH",
+                _format_uid_set(group),
+                f"(UID {' '.join(items)})",
+            )
+            if status != "OK" or not msg_data:
+                continue
+            fetched = parse_section_response(msg_data)
+            for uid in group:
+                found = fetched.get(uid)
+                if found is None:
+                    continue
+                headers = next(
+                    (data for key, data in found.items() if key.upper().startswith("HEADER")),
+                    b"",
+                )
+                parts = [
+                    (part, found[part.section])
+                    for part in parts_by_uid[uid]
+                    if part.section in found
+                ]
+                bodies[uid] = build_text_message(headers, parts, cap)
+
+        bodies.update(self._fetch_full_bodies(fallback))
+        return bodies
+
     def mark_seen(self, uid: int) -> None:
         if not self.client:
             raise RuntimeError("IMAP session not initialized")
         self.client.uid("STORE", str(uid), "+FLAGS", "\\Seen")
 
+    def mark_seen_batch(self, uids: List[int]) -> None:
+        if not self.client:
+            raise RuntimeError("IMAP session not initialized")
+        for chunk in _chunked(sorted(set(uids)), FETCH_CHUNK_SIZE):
+            self.client.uid("STORE", _format_uid_set(chunk), "+FLAGS", "\\Seen")
+
     @staticmethod
     def extract_message_id(headers_raw: bytes) -> Optional[str]:
         if not headers_raw:
@@ -88,11 +448,63 @@ class ImapSession:
         return message_id.strip() if message_id else None
 
 
+class ImapSessionPool:
+    """Authenticated sessions shared across mailbox syncs.
+
+    Sessions are keyed by account and bounded per account so several
+    mailboxes can sync concurrently without exceeding the server's
+    connection limit. A session is re-selected for each mailbox it serves.
+    """
+
+    def __init__(self, factory: Callable[[MailAccount], ImapSession]) -> None:
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[ImapSession]] = {}
+        self._limits: Dict[str, threading.BoundedSemaphore] = {}
+
+    def _limit(self, account: MailAccount) -> threading.BoundedSemaphore:
+        with self._lock:
+            if account.name not in self._limits:
+                self._limits[account.name] = threading.BoundedSemaphore(account.max_connections)
+            return self._limits[account.name]
+
+    @contextmanager
+    def session(self, account: MailAccount, mailbox: str) -> Iterator[ImapSession]:
+        limit = self._limit(account)
+        limit.acquire()
+        session: Optional[ImapSession] = None
+        healthy = False
+        try:
+            with self._lock:
+                idle = self._idle.get(account.name) or []
+                session = idle.pop() if idle else None
+            if session is None:
+                session = self._factory(account).open()
+            session.select(mailbox)
+            yield session
+            healthy = True
+        finally:
+            if session is not None:
+                if healthy and not session.broken:
+                    with self._lock:
+                        self._idle.setdefault(account.name, []).append(session)
+                else:
+                    session.close()
+            limit.release()
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
+
+
 def fetch_messages(search_query: str = "UNSEEN", mark_seen: bool = False) -> List[bytes]:
     user = _get_env("IMAP_USER")
     password = _get_env("IMAP_PASSWORD")
 
-    client = imaplib.IMAP4_SSL("imap.mail.me.com", 993)
+    client = connect()
     try:
         client.login(user, password)
         client.select("INBOX", readonly=not mark_seen)
@@ -0,0 +1,209 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+
+TEXT_SUBTYPES = {"plain", "html"}
+SYNTH_BOUNDARY = "=_mailsummary_text_parts"
+
+_LITERAL_RE = re.compile(rb"\{(\d+)\}$")
+_MESSAGE_START_RE = re.compile(rb"^\s*\d+ \(")
+_UID_RE = re.compile(rb"UID (\d+)")
+_SECTION_RE = re.compile(rb"BODY\[([^\]]*)\](?:<\d+>)? \{\d+\}$")
+
+Token = Union[str, None, List["Token"]]
+
+
+@dataclass
+class TextPart:
+    section: str
+    subtype: str
+    charset: Optional[str]
+    encoding: str
+    size: int
+
+
+def _flatten_response(msg_data) -> bytes:
+    """Join an imaplib FETCH response back into one line, inlining literals as
+    quoted strings so the tokenizer only deals with one representation."""
+    chunks: List[bytes] = []
+    for item in msg_data or []:
+        if isinstance(item, tuple) and len(item) >= 2:
+            prefix, literal = item[0], item[1]
+            prefix = _LITERAL_RE.sub(b"", prefix)
+            escaped = literal.replace(b"\\", b"\\\\").replace(b'"', b'\\"')
+            chunks.append(prefix + b'"' + escaped + b'"')
+        elif isinstance(item, bytes):
+            chunks.append(item)
+    return b"".join(chunks)
+
+
+def _tokenize(data: bytes) -> List[Token]:
+    stack: List[List[Token]] = [[]]
+    i = 0
+    length = len(data)
+    while i < length:
+        ch = data[i : i + 1]
+        if ch in (b" ", b"\r", b"\n"):
+            i += 1
+        elif ch == b"(":
+            stack.append([])
+            i += 1
+        elif ch == b")":
+            if len(stack) > 1:
+                done = stack.pop()
+                stack[-1].append(done)
+            i += 1
+        elif ch == b'"':
+            i += 1
+            buf = bytearray()
+            while i < length and data[i : i + 1] != b'"':
+                if data[i : i + 1] == b"\\" and i + 1 < length:
+                    i += 1
+                buf += data[i : i + 1]
+                i += 1
+            i += 1
+            stack[-1].append(buf.decode("latin-1"))
+        else:
+            start = i
+            while i < length and data[i : i + 1] not in (b" ", b"(", b")", b"\r", b"\n"):
+                i += 1
+            atom = data[start:i].decode("latin-1")
+            stack[-1].append(None if atom.upper() == "NIL" else atom)
+    while len(stack) > 1:
+        done = stack.pop()
+        stack[-1].append(done)
+    return stack[0]
+
+
+def parse_bodystructures(msg_data) -> Dict[int, List[Token]]:
+    """Map UID -> parsed BODYSTRUCTURE list for a multi-UID FETCH response."""
+    tokens = _tokenize(_flatten_response(msg_data))
+    structures: Dict[int, List[Token]] = {}
+    for token in tokens:
+        if not isinstance(token, list):
+            continue
+        fields = dict(zip(token[::2], token[1::2]))
+        uid = fields.get("UID")
+        structure = fields.get("BODYSTRUCTURE")
+        if isinstance(uid, str) and uid.isdigit() and isinstance(structure, list):
+            structures[int(uid)] = structure
+    return structures
+
+
+def _param(params: Token, name: str) -> Optional[str]:
+    if not isinstance(params, list):
+        return None
+    for key, value in zip(params[::2], params[1::2]):
+        if isinstance(key, str) and key.lower() == name and isinstance(value, str):
+            return value
+    return None
+
+
+def _is_attachment(node: List[Token]) -> bool:
+    for field in node[8:]:
+        if isinstance(field, list) and field and isinstance(field[0], str):
+            if field[0].lower() == "attachment":
+                return True
+    return False
+
+
+def text_parts(structure: List[Token], prefix: str = "") -> List[TextPart]:
+    """Collect inline text/plain and text/html sections from a BODYSTRUCTURE."""
+    if structure and isinstance(structure[0], list):
+        found: List[TextPart] = []
+        index = 1
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            section = f"{prefix}.{index}" if prefix else str(index)
+            found.extend(text_parts(child, section))
+            index += 1
+        return found
+
+    if len(structure) < 7 or not all(isinstance(v, str) for v in structure[:2]):
+        return []
+    maintype = str(structure[0]).lower()
+    subtype = str(structure[1]).lower()
+    if maintype != "text" or subtype not in TEXT_SUBTYPES or _is_attachment(structure):
+        return []
+    size = structure[6]
+    return [
+        TextPart(
+            section=prefix or "1",
+            subtype=subtype,
+            charset=_param(structure[2], "charset"),
+            encoding=str(structure[5] or "7bit").lower(),
+            size=int(size) if isinstance(size, str) and size.isdigit() else 0,
+        )
+    ]
+
+
+def parse_section_response(msg_data) -> Dict[int, Dict[str, bytes]]:
+    """Map UID -> {section: bytes} for a FETCH that requested several
+    BODY[...] sections per message."""
+    results: Dict[int, Dict[str, bytes]] = {}
+    uid: Optional[int] = None
+    sections: Dict[str, bytes] = {}
+
+    def _flush() -> None:
+        if uid is not None:
+            results.setdefault(uid, {}).update(sections)
+
+    for item in msg_data or []:
+        if isinstance(item, tuple) and len(item) >= 2:
+            prefix, payload = item[0], item[1]
+            if _MESSAGE_START_RE.match(prefix):
+                _flush()
+                uid, sections = None, {}
+            match = _UID_RE.search(prefix)
+            if match:
+                uid = int(match.group(1))
+            section = _SECTION_RE.search(prefix)
+            if section and isinstance(payload, bytes):
+                sections[section.group(1).decode("latin-1")] = payload
+        elif isinstance(item, bytes):
+            match = _UID_RE.search(item)
+            if match:
+                uid = int(match.group(1))
+    _flush()
+    return results
+
+
+def _trim_truncated(data: bytes, encoding: str) -> bytes:
+    if encoding == "base64":
+        cut = data.rfind(b"\n")
+        if cut > 0:
+            return data[: cut + 1]
+        compact = data.strip()
+        return compact[: len(compact) // 4 * 4]
+    if encoding == "quoted-printable":
+        cut = data.rfind(b"=", max(0, len(data) - 3))
+        if cut >= 0:
+            return data[:cut]
+    return data
+
+
+def build_text_message(
+    headers: bytes,
+    parts: List[Tuple[TextPart, bytes]],
+    max_part_bytes: int,
+) -> bytes:
+    """Assemble a minimal MIME message from fetched header fields and text
+    sections so parse_email can consume it unchanged."""
+    lines = [headers.rstrip(b"\r\n")]
+    lines.append(b"MIME-Version: 1.0")
+    lines.append(f'Content-Type: multipart/mixed; boundary="{SYNTH_BOUNDARY}"'.encode("ascii"))
+    lines.append(b"")
+    for part, data in parts:
+        if max_part_bytes and len(data) >= max_part_bytes:
+            data = _trim_truncated(data, part.encoding)
+        charset = part.charset or "utf-8"
+        lines.append(f"--{SYNTH_BOUNDARY}".encode("ascii"))
+        lines.append(f'Content-Type: text/{part.subtype}; charset="{charset}"'.encode("latin-1"))
+        lines.append(f"Content-Transfer-Encoding: {part.encoding}".encode("latin-1"))
+        lines.append(b"")
+        lines.append(data)
+    lines.append(f"--{SYNTH_BOUNDARY}--".encode("ascii"))
+    lines.append(b"")
+    return b"\r\n".join(lines)
@@ -1,73 +1,63 @@
+import os
 import re
-from typing import Dict, List, Optional
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
 
 import requests
+import requests.adapters
 from bs4 import BeautifulSoup
 
+from .domain_health import COOLDOWN_MINUTES, FAILURE_THRESHOLD, DomainHealth
+from .env import safe_float, safe_int
+from .store import get_url_cache, get_url_redirects, upsert_url_cache, upsert_url_redirects
+from .url_canon import canonical_url
+from .url_filter import UrlFilter, load_url_filter
 
-# URL patterns to exclude (ads, tracking, social, etc.)
-# Add more patterns here as you discover them to continuously improve filtering
-EXCLUDE_URL_PATTERNS = [
-    # Advertising & sponsorship
-    r"advertise\.tldr\.tech",
-    r"advertise\.",
-    r"/ads?/",
-    r"/sponsor",
-    # Job postings
-    r"jobs\.ashbyhq\.com",
-    r"/jobs/",
-    r"/careers/",
-    # Newsletter management
-    r"/unsubscribe",
-    r"/manage\?",
-    r"/preferences",
-    r"/settings",
-    # Referral & tracking
-    r"refer\.tldr\.tech",
-    r"/refer/",
-    r"/referral",
-    r"hub\.sparklp\.co",
-    r"a\.tldrnewsletter\.com/web-version",
-    r"a\.tldrnewsletter\.com/unsubscribe",
-    # Social media profiles (usually not valuable article content)
-    r"twitter\.com/",
-    r"x\.com/",
-    r"linkedin\.com/in/",
-    r"linkedin\.com/feed/",
-    # Generic sign-up pages
-    r"/signup",
-    r"/sign-up",
-    r"/register",
-]
 
+LINK_FETCH_WORKERS = 8
+LINK_FETCH_PER_HOST = 2
+LINK_FETCH_DEADLINE = 15.0
+URL_CACHE_TTL_HOURS = 168
+URL_CACHE_NEGATIVE_TTL_HOURS = 6
+URL_CACHE_MAX_CHARS = 20_000
+LINK_FETCH_MAX_BYTES = 2_000_000
 
-def is_valuable_url(url: str) -> bool:
-    """Check if URL is valuable content (not ads, tracking, social profiles, etc.)."""
-    url_lower = url.lower()
+_url_filter: Optional[UrlFilter] = None
 
-    for pattern in EXCLUDE_URL_PATTERNS:
-        if re.search(pattern, url_lower):
-            return False
 
-    return True
+def get_url_filter() -> UrlFilter:
+    """Compile the exclusion rules on first use (see url_filter.py)."""
+    global _url_filter
+    if _url_filter is None:
+        _url_filter = load_url_filter()
+    return _url_filter
 
 
-def extract_links(text: str) -> List[str]:
-    """Extract HTTP/HTTPS URLs from text."""
-    bracket_pattern = r"\[?(https?://[^\s<>\"{}|\\^`\[\]]+)\]?"
-    bare_pattern = r"https?://[^\s<>\"{}|\\^`\[\]]+"
+def is_valuable_url(url: str) -> bool:
+    """Check if URL is valuable content (not ads, tracking, social profiles, etc.)."""
+    return not get_url_filter().excludes(url)
 
-    urls = re.findall(bracket_pattern, text)
-    if not urls:
-        urls = re.findall(bare_pattern, text)
 
+def filter_links(urls: Iterable[str]) -> List[str]:
+    """Normalize, de-duplicate and drop ad/tracking/social URLs, keeping order."""
     seen = set()
     unique_urls = []
     filtered_count = 0
 
     for url in urls:
         url = url.rstrip(".,;:!?)]").lstrip("[")
-        if url not in seen and url.startswith(("http://", "https://")):
+        if not url.startswith(("http://", "https://")):
+            continue
+        # Unwrap tracking redirects and drop utm_* etc. so the same article
+        # behind different wrappers is filtered, deduped and cached as one.
+        url = canonical_url(url)
+        if url not in seen:
             if is_valuable_url(url):
                 seen.add(url)
                 unique_urls.append(url)
@@ -80,38 +70,131 @@ def extract_links(text: str) -> List[str]:
     return unique_urls
 
 
-def fetch_url_content(url: str, timeout: int = 5) -> Optional[str]:
-    """Fetch and extract text content from a URL."""
-    try:
-        headers = {
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36"
-            )
-        }
-        response = requests.get(url, timeout=timeout, headers=headers, allow_redirects=True)
-        response.raise_for_status()
+def extract_links(text: str) -> List[str]:
+    """Extract HTTP/HTTPS URLs from text."""
+    bracket_pattern = r"\[?(https?://[^\s<>\"{}|\\^`\[\]]+)\]?"
+    bare_pattern = r"https?://[^\s<>\"{}|\\^`\[\]]+"
 
-        content_type = response.headers.get("Content-Type", "")
-        if "text/html" not in content_type.lower():
-            return None
+    urls = re.findall(bracket_pattern, text)
+    if not urls:
+        urls = re.findall(bare_pattern, text)
 
-        soup = BeautifulSoup(response.text, "lxml")
+    return filter_links(urls)
 
-        for tag in soup(["script", "style", "nav", "header", "footer", "aside", "noscript"]):
-            tag.decompose()
 
-        main_content = soup.find("main") or soup.find("article") or soup.find("body")
+@dataclass
+class FetchResult:
+    status: str  # ok, not_modified, not_html, empty or error
+    text: Optional[str]
+    final_url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    error: Optional[str] = None  # timeout, connection, http_<code> or other
 
-        if main_content:
-            text = main_content.get_text(separator="\n", strip=True)
-            lines = [line.strip() for line in text.splitlines() if line.strip()]
-            return "\n".join(lines)
 
-        return None
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """One keep-alive connection pool per process, sized to the fetch cap."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = safe_int(os.getenv("LINK_FETCH_WORKERS"), LINK_FETCH_WORKERS)
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+            _session = session
+        return _session
+
+
+def _extract_article_text(html: bytes, encoding: Optional[str]) -> Optional[str]:
+    soup = BeautifulSoup(html, "lxml", from_encoding=encoding)
+
+    for tag in soup(["script", "style", "nav", "header", "footer", "aside", "noscript"]):
+        tag.decompose()
+
+    main_content = soup.find("main") or soup.find("article") or soup.find("body")
+
+    if main_content:
+        text = main_content.get_text(separator="\n", strip=True)
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        if lines:
+            return "\n".join(lines)
+    return None
+
+
+def fetch_url(
+    url: str,
+    timeout: int = 5,
+    *,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+) -> FetchResult:
+    """Fetch and extract text content from a URL.
+
+    The content type is checked from the headers before any of the body is
+    read, and the body is streamed only up to ``max_bytes`` (default
+    ``LINK_FETCH_MAX_BYTES``); a truncated page is still parsed. ``etag`` and
+    ``last_modified`` make the request conditional, and a 304 comes back as
+    ``not_modified``.
+    """
+    if max_bytes is None:
+        max_bytes = safe_int(os.getenv("LINK_FETCH_MAX_BYTES"), LINK_FETCH_MAX_BYTES)
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        with get_http_session().get(
+            url, timeout=timeout, headers=headers, allow_redirects=True, stream=True
+        ) as response:
+            final_url = response.url or url
+            validators = {
+                "etag": response.headers.get("ETag") or etag,
+                "last_modified": response.headers.get("Last-Modified") or last_modified,
+            }
+            if response.status_code == 304:
+                return FetchResult("not_modified", None, final_url, **validators)
+            response.raise_for_status()
+
+            content_type = response.headers.get("Content-Type", "")
+            if "text/html" not in content_type.lower():
+                return FetchResult("not_html", None, final_url, **validators)
+
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                body.extend(chunk)
+                if max_bytes and len(body) >= max_bytes:
+                    del body[max_bytes:]
+                    break
+            text = _extract_article_text(bytes(body), response.encoding)
+            if text:
+                return FetchResult("ok", text, final_url, **validators)
+            return FetchResult("empty", None, final_url, **validators)
+    except requests.Timeout as exc:
+        print(f"  Warning: Timed out fetching {url[:60]}... - {str(exc)[:50]}")
+        return FetchResult("error", None, url, error="timeout")
+    except requests.HTTPError as exc:
+        print(f"  Warning: Failed to fetch {url[:60]}... - {str(exc)[:50]}")
+        code = exc.response.status_code if exc.response is not None else 0
+        return FetchResult("error", None, url, error=f"http_{code}")
+    except requests.ConnectionError as exc:
+        print(f"  Warning: Failed to fetch {url[:60]}... - {str(exc)[:50]}")
+        return FetchResult("error", None, url, error="connection")
     except Exception as exc:
         print(f"  Warning: Failed to fetch {url[:60]}... - {str(exc)[:50]}")
-        return None
+        return FetchResult("error", None, url, error="other")
+
+
+def fetch_url_content(url: str, timeout: int = 5) -> Optional[str]:
+    """Fetch and extract text content from a URL."""
+    return fetch_url(url, timeout=timeout).text
 
 
 def select_links_to_fetch(
@@ -147,14 +230,238 @@ def select_links_to_fetch(
     return links[:max_links]
 
 
+class FetchLimiter:
+    """Process-wide cap on in-flight fetches plus a per-host cap, shared by
+    every email (and every mailbox thread) that enriches links."""
+
+    def __init__(self, max_workers: int, per_host: int) -> None:
+        self.max_workers = max(1, max_workers)
+        self.per_host = max(1, per_host)
+        self._global = threading.BoundedSemaphore(self.max_workers)
+        self._hosts: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = (urlsplit(url).hostname or "").lower()
+        with self._lock:
+            slot = self._hosts.get(host)
+            if slot is None:
+                slot = self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return slot
+
+    def fetch(self, url: str, **kwargs) -> FetchResult:
+        health = get_domain_health()
+        try:
+            with self._host_slot(url), self._global:
+                started = time.monotonic()
+                result = fetch_url(url, **kwargs)
+                health.record(url, seconds=time.monotonic() - started, error=result.error)
+                return result
+        finally:
+            health.release(url)
+
+
+_limiter: Optional[FetchLimiter] = None
+_limiter_lock = threading.Lock()
+_health: Optional[DomainHealth] = None
+
+
+def get_domain_health() -> DomainHealth:
+    global _health
+    with _limiter_lock:
+        if _health is None:
+            _health = DomainHealth(
+                failure_threshold=safe_int(os.getenv("CIRCUIT_FAILURE_THRESHOLD"), FAILURE_THRESHOLD),
+                cooldown=timedelta(minutes=safe_float(os.getenv("CIRCUIT_COOLDOWN_MINUTES"), COOLDOWN_MINUTES)),
+            )
+        return _health
+
+
+def get_fetch_limiter() -> FetchLimiter:
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = FetchLimiter(
+                safe_int(os.getenv("LINK_FETCH_WORKERS"), LINK_FETCH_WORKERS),
+                safe_int(os.getenv("LINK_FETCH_PER_HOST"), LINK_FETCH_PER_HOST),
+            )
+        return _limiter
+
+
+class UrlCacheStats:
+    """Counters for url_cache lookups, reported at the end of a run."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+    def record(self, *, hits: int = 0, negative_hits: int = 0, misses: int = 0, revalidated: int = 0) -> None:
+        with self._lock:
+            self.hits += hits
+            self.negative_hits += negative_hits
+            self.misses += misses
+            self.revalidated += revalidated
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits = self.negative_hits = self.misses = self.revalidated = 0
+
+    def summary(self) -> Optional[str]:
+        lookups = self.hits + self.negative_hits + self.misses
+        if not lookups:
+            return None
+        rate = (self.hits + self.negative_hits) / lookups
+        return (
+            f"URL cache: {self.hits} hit(s), {self.negative_hits} negative hit(s), "
+            f"{self.misses} fetch(es) ({self.revalidated} revalidated with 304) - hit rate {rate:.0%}"
+        )
+
+
+url_cache_stats = UrlCacheStats()
+
+
+def _cache_ttl(status: str) -> timedelta:
+    if status == "ok":
+        return timedelta(hours=safe_float(os.getenv("URL_CACHE_TTL_HOURS"), URL_CACHE_TTL_HOURS))
+    return timedelta(hours=safe_float(os.getenv("URL_CACHE_NEGATIVE_TTL_HOURS"), URL_CACHE_NEGATIVE_TTL_HOURS))
+
+
 def fetch_links_content(
     links_to_fetch: List[str],
     max_chars_per_link: int = 1000,
+    deadline: Optional[float] = None,
+    conn: Optional[sqlite3.Connection] = None,
 ) -> Dict[str, str]:
+    """Fetch links concurrently under the shared limiter.
+
+    With ``conn``, fresh ``url_cache`` entries (including cached failures)
+    are used without any network call, expired entries with an ETag or
+    Last-Modified are revalidated with a conditional GET, and new results are
+    written back in the caller's transaction. Links to domains whose circuit
+    is open (see domain_health.py) are skipped.
+    Returns whatever finished within ``deadline`` seconds (default
+    ``LINK_FETCH_DEADLINE``), in the order the links were given; slower links
+    are abandoned.
+    """
+    if not links_to_fetch:
+        return {}
+    if deadline is None:
+        deadline = safe_float(os.getenv("LINK_FETCH_DEADLINE"), LINK_FETCH_DEADLINE)
+
+    results: Dict[str, Optional[str]] = {}
+    keys = {url: canonical_url(url) for url in links_to_fetch}
+    # What to request for each link: a remembered redirect target skips the chain.
+    targets = dict(keys)
+    to_fetch = list(links_to_fetch)
+    stale: Dict[str, Dict] = {}
+    if conn is not None:
+        redirects = get_url_redirects(conn, keys.values())
+        targets = {url: redirects.get(key, key) for url, key in keys.items()}
+        cached = get_url_cache(conn, [*keys.values(), *targets.values()], include_expired=True)
+        now = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+        to_fetch = []
+        for url in links_to_fetch:
+            entries = [entry for entry in (cached.get(keys[url]), cached.get(targets[url])) if entry]
+            fresh = next((entry for entry in entries if entry["expires_at"] > now), None)
+            if fresh is not None:
+                results[url] = fresh["content"] if fresh["status"] == "ok" else None
+                continue
+            to_fetch.append(url)
+            revalidate = next(
+                (e for e in entries if e["status"] == "ok" and (e["etag"] or e["last_modified"])),
+                None,
+            )
+            if revalidate is not None:
+                stale[url] = revalidate
+        negative = sum(1 for url in results if results[url] is None)
+        url_cache_stats.record(hits=len(results) - negative, negative_hits=negative, misses=len(to_fetch))
+        if not to_fetch:
+            print(f"    All {len(links_to_fetch)} link(s) served from the URL cache")
+
+    health = get_domain_health()
+    if conn is not None:
+        health.load(conn)
+    blocked = [url for url in to_fetch if not health.allow(targets[url])]
+    if blocked:
+        print(f"    Skipping {len(blocked)} link(s) to domains with an open circuit")
+        to_fetch = [url for url in to_fetch if url not in blocked]
+
+    fetched: Dict[str, FetchResult] = {}
+    if to_fetch:
+        limiter = get_fetch_limiter()
+        cached_note = f" ({len(results)} cached)" if results else ""
+        print(f"    Fetching {len(to_fetch)} link(s){cached_note}, up to {limiter.max_workers} at a time...")
+        executor = ThreadPoolExecutor(
+            max_workers=min(len(to_fetch), limiter.max_workers),
+            thread_name_prefix="link-fetch",
+        )
+        futures = {}
+        try:
+            futures = {
+                executor.submit(
+                    limiter.fetch,
+                    targets[url],
+                    etag=stale.get(url, {}).get("etag"),
+                    last_modified=stale.get(url, {}).get("last_modified"),
+                ): url
+                for url in to_fetch
+            }
+            pending = set(futures)
+            remaining = deadline
+            started = time.monotonic()
+            while pending and remaining > 0:
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    fetched[futures[future]] = future.result()
+                remaining = deadline - (time.monotonic() - started)
+            if pending:
+                print(f"    Link deadline ({deadline:.0f}s) reached; skipped {len(pending)} slow link(s)")
+        finally:
+            # Do not wait for abandoned fetches; they finish on their own timeout.
+            executor.shutdown(wait=False, cancel_futures=True)
+            # Cancelled fetches never ran, so hand back any half-open probe they held.
+            for future, url in futures.items():
+                if future.cancelled():
+                    health.release(targets[url])
+
+    max_cached_chars = safe_int(os.getenv("URL_CACHE_MAX_CHARS"), URL_CACHE_MAX_CHARS)
+    resolved: Dict[str, str] = {}
+    revalidated = 0
+    for url, result in fetched.items():
+        status, content = result.status, result.text
+        if status == "not_modified" and url in stale:
+            status, content = "ok", stale[url]["content"]
+            revalidated += 1
+        results[url] = content
+        if conn is None:
+            continue
+        cache_urls = {keys[url]}
+        final_key = canonical_url(result.final_url)
+        if status != "error" and final_key != keys[url]:
+            resolved[keys[url]] = final_key
+            cache_urls.add(final_key)
+        for cache_url in cache_urls:
+            upsert_url_cache(
+                conn,
+                url=cache_url,
+                status=status,
+                content=content[:max_cached_chars] if content else None,
+                ttl=_cache_ttl(status),
+                etag=result.etag,
+                last_modified=result.last_modified,
+                commit=False,
+            )
+    if conn is not None:
+        upsert_url_redirects(conn, resolved, commit=False)
+        url_cache_stats.record(revalidated=revalidated)
+        health.flush(conn)
+
     link_contents: Dict[str, str] = {}
-    for i, url in enumerate(links_to_fetch, 1):
-        print(f"    Fetching link {i}/{len(links_to_fetch)}: {url[:60]}...")
-        content = fetch_url_content(url)
+    for url in links_to_fetch:
+        content = results.get(url)
         if content:
             if len(content) > max_chars_per_link:
                 content = content[:max_chars_per_link] + "..."
@@ -168,6 +475,7 @@ def fetch_links_interactive(
     max_links: int = 10,
     max_chars_per_link: int = 1000,
     interactive: bool = True,
+    conn: Optional[sqlite3.Connection] = None,
 ) -> Dict[str, str]:
     links_to_fetch = select_links_to_fetch(
         links, subject=subject, max_links=max_links, interactive=interactive
@@ -176,7 +484,7 @@ def fetch_links_interactive(
         return {}
 
     link_contents = fetch_links_content(
-        links_to_fetch, max_chars_per_link=max_chars_per_link
+        links_to_fetch, max_chars_per_link=max_chars_per_link, conn=conn
     )
     if link_contents:
         skipped = len(links) - len(links_to_fetch)
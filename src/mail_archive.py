@@ -0,0 +1,67 @@
+import email.parser
+import mailbox
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+
+def _iter_mbox(path: Path) -> Iterator[Tuple[str, bytes]]:
+    box = mailbox.mbox(str(path), create=False)
+    try:
+        for index, key in enumerate(box.iterkeys()):
+            yield f"mbox:{path}:{index}", box.get_bytes(key)
+    finally:
+        box.close()
+
+
+def _iter_maildir(path: Path) -> Iterator[Tuple[str, bytes]]:
+    box = mailbox.Maildir(str(path), factory=None, create=False)
+    for key in sorted(box.iterkeys()):
+        yield f"maildir:{path}:{key}", box.get_bytes(key)
+    for folder in box.list_folders():
+        yield from _iter_maildir(path / f".{folder}")
+
+
+def _is_maildir(path: Path) -> bool:
+    return all((path / name).is_dir() for name in ("cur", "new", "tmp"))
+
+
+def iter_archive_messages(path: str) -> Iterator[Tuple[str, bytes]]:
+    """Yield ``(source_uid, raw_bytes)`` from an mbox file, a Maildir tree,
+    a single .eml file or a directory of .eml files."""
+    root = Path(path)
+    if root.is_file():
+        if root.suffix.lower() == ".eml":
+            yield f"file:{root}", root.read_bytes()
+        else:
+            yield from _iter_mbox(root)
+        return
+    if not root.is_dir():
+        raise RuntimeError(f"Archive path not found: {path}")
+    if _is_maildir(root):
+        yield from _iter_maildir(root)
+        return
+    maildirs = []
+    for child in sorted(root.rglob("*")):
+        if any(parent in maildirs for parent in child.parents):
+            continue
+        if child.is_dir() and _is_maildir(child):
+            maildirs.append(child)
+            yield from _iter_maildir(child)
+        elif child.is_file() and child.suffix.lower() == ".eml":
+            yield f"file:{child}", child.read_bytes()
+        elif child.is_file() and child.suffix.lower() == ".mbox":
+            yield from _iter_mbox(child)
+
+
+def header_block(raw: bytes) -> bytes:
+    end = raw.find(b"\r\n\r\n")
+    if end < 0:
+        end = raw.find(b"\n\n")
+    return raw if end < 0 else raw[: end + 2]
+
+
+def extract_message_id(raw: bytes) -> Optional[str]:
+    # Only the header block is parsed; bodies are left to the worker pool.
+    msg = email.parser.BytesHeaderParser().parsebytes(header_block(raw))
+    message_id = msg.get("Message-ID")
+    return message_id.strip() if message_id else None
@@ -4,7 +4,7 @@ from dotenv import load_dotenv
 
 from .digest_writer import write_digest
 from .pipeline import build_digest_items, format_digest_markdown, ingest_emails
-from .roles import get_role, load_roles
+from .roles import enabled_roles, get_role, load_roles
 
 
 def main() -> None:
@@ -22,7 +22,7 @@ def main() -> None:
     if not role:
         raise RuntimeError("Default role 'CTO' is missing from roles.yaml")
 
-    items = build_digest_items(role, content_ids=new_content_ids or None)
+    items = build_digest_items(role, content_ids=new_content_ids or None, roles=enabled_roles(roles))
     if not items:
         print("No items to digest after filtering.")
         return
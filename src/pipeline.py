@@ -1,51 +1,89 @@
+import imaplib
 import json
 import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, Iterable, List, Optional, Tuple
+from functools import partial
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+from .accounts import MailAccount, MailboxSource, load_accounts, mailbox_sources
 from .agent_pipeline import (
     CATEGORIES,
     DOMAIN_TAGS,
+    LLM_CONCURRENCY,
+    analyze_content,
     classify_category,
-    generate_role_angles,
+    generate_multi_role_angles,
     summarize_content,
     tag_topics,
 )
-from .email_parse import is_newsletter, parse_email
-from .icloud_imap import ImapSession
-from .link_fetcher import extract_links, fetch_links_interactive
+from .boilerplate import BoilerplateLearner
+from .email_parse import MAX_MESSAGE_BYTES, MAX_TEXT_CHARS, parse_email
+from .env import env_bool, safe_float, safe_int
+from .icloud_imap import (
+    BODY_CHUNK_SIZE,
+    IDLE_TIMEOUT,
+    MAX_PART_BYTES,
+    ImapSession,
+    ImapSessionPool,
+)
+from .link_fetcher import extract_links, fetch_links_interactive, filter_links, url_cache_stats
+from .mail_archive import extract_message_id, header_block, iter_archive_messages
+from .prefilter import PrefilterRules, evaluate, header_summary, load_prefilter
 from .roles import Role
+from .segment import Story, split_stories
 from .store import (
+    clear_source_uids,
     compute_content_id,
     content_exists,
+    existing_message_ids,
+    existing_source_uids,
     get_ai_cache,
     get_content_items,
     get_content_items_by_ids,
     get_connection,
-    get_last_uid,
-    get_role_cache,
+    get_ingest_state,
+    get_role_caches,
+    get_story_items,
+    get_unenriched_items,
     init_db,
     insert_content_item,
-    insert_role_cache,
-    set_last_uid,
+    insert_role_caches,
+    remap_source_uids,
+    set_ingest_state,
+    set_link_content,
     upsert_ai_cache,
 )
 
 
-def _env_bool(name: str, default: bool = False) -> bool:
-    val = os.getenv(name)
-    if val is None:
-        return default
-    return val.strip().lower() in {"1", "true", "yes", "y"}
+_STREAM_DONE = object()
 
 
-def _safe_int(value: Optional[str], default: int) -> int:
-    if value is None or value == "":
-        return default
-    try:
-        return int(value)
-    except ValueError:
-        return default
+_boilerplate: Optional[BoilerplateLearner] = None
+
+
+def get_boilerplate_learner() -> Optional[BoilerplateLearner]:
+    global _boilerplate
+    if not env_bool("BOILERPLATE_STRIP", True):
+        return None
+    if _boilerplate is None:
+        # A share outside (0, 1] would strip every line or none at all.
+        min_share = safe_float(os.getenv("BOILERPLATE_MIN_SHARE"), 0.6)
+        if not 0 < min_share <= 1:
+            min_share = 1.0 if min_share > 1 else 0.6
+        _boilerplate = BoilerplateLearner(
+            history=max(1, safe_int(os.getenv("BOILERPLATE_HISTORY"), 20)),
+            min_issues=max(2, safe_int(os.getenv("BOILERPLATE_MIN_ISSUES"), 3)),
+            min_share=min_share,
+        )
+    return _boilerplate
 
 
 def _build_prompt_text(item: Dict[str, str], max_body_chars: int) -> str:
@@ -82,116 +120,820 @@ def _domain_tag_from_topics(tags: Iterable[str]) -> Optional[str]:
     return None
 
 
-def ingest_emails() -> Tuple[int, int, List[str]]:
+def _iter_bodies_serial(
+    session: ImapSession,
+    uids: List[int],
+    parse: Callable[[bytes], Optional[Dict[str, str]]],
+) -> Iterator[Tuple[int, Optional[Dict[str, str]]]]:
+    for uid in uids:
+        raw = session.fetch_body(uid)
+        yield uid, parse(raw) if raw else None
+
+
+def _iter_bodies_streaming(
+    session: ImapSession,
+    uids: List[int],
+    parse: Callable[[bytes], Optional[Dict[str, str]]],
+    *,
+    chunk_size: int,
+    workers: int,
+    queue_size: int,
+) -> Iterator[Tuple[int, Optional[Dict[str, str]]]]:
+    """Download bodies in multi-UID chunks on a background thread while a
+    worker pool parses them, yielding results in UID order.
+
+    Only the download thread touches the IMAP socket; callers keep the SQLite
+    connection on their own thread.
+    """
+    raw_queue: "queue.Queue[object]" = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def _put(entry: object) -> bool:
+        while not stop.is_set():
+            try:
+                raw_queue.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _download() -> None:
+        try:
+            for chunk in session.iter_bodies(uids, chunk_size=chunk_size):
+                for uid, raw in chunk:
+                    if not _put((uid, raw)):
+                        return
+        except BaseException as exc:  # surfaced on the consumer thread
+            errors.append(exc)
+        finally:
+            _put(_STREAM_DONE)
+
+    downloader = threading.Thread(target=_download, name="imap-body-fetch", daemon=True)
+    downloader.start()
+    in_flight: Deque[Tuple[int, Optional[Future]]] = deque()
+    max_in_flight = max(1, workers) * 2
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            while True:
+                entry = raw_queue.get()
+                if entry is _STREAM_DONE:
+                    break
+                uid, raw = entry  # type: ignore[misc]
+                future = executor.submit(parse, raw) if raw else None
+                in_flight.append((uid, future))
+                while len(in_flight) >= max_in_flight:
+                    done_uid, done = in_flight.popleft()
+                    yield done_uid, done.result() if done else None
+            while in_flight:
+                done_uid, done = in_flight.popleft()
+                yield done_uid, done.result() if done else None
+    finally:
+        stop.set()
+        downloader.join(timeout=5)
+        if downloader.is_alive():
+            # Still inside a multi-UID FETCH: nobody else may use the socket.
+            session.broken = True
+    if errors:
+        raise errors[0]
+
+
+class IngestBudget:
+    """Stop conditions shared by every mailbox worker in one ingest run."""
+
+    def __init__(
+        self,
+        max_messages: Optional[int] = None,
+        time_budget: Optional[float] = None,
+    ) -> None:
+        self.max_messages = max_messages
+        self.deadline = time.monotonic() + time_budget if time_budget else None
+        self._used = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self._stopped.is_set():
+                return False
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                self._stopped.set()
+                return False
+            if self.max_messages is not None and self._used >= self.max_messages:
+                self._stopped.set()
+                return False
+            self._used += 1
+            return True
+
+    def cancel(self) -> None:
+        self._stopped.set()
+
+    @property
+    def exhausted(self) -> bool:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self._stopped.set()
+        return self._stopped.is_set()
+
+
+@dataclass
+class IngestSettings:
+    search_query: str
+    mark_seen: bool
+    newsletter_only: bool
+    max_body_chars: int
+    stream: bool
+    text_parts_only: bool
+    max_part_bytes: int
+    max_text_chars: int
+    max_message_bytes: int
+    split_stories: bool
+    min_stories: int
+
+
+def _ingest_settings(stream: Optional[bool]) -> IngestSettings:
+    return IngestSettings(
+        search_query=os.getenv("IMAP_SEARCH", "UNSEEN"),
+        mark_seen=env_bool("MARK_SEEN", False),
+        newsletter_only=env_bool("NEWSLETTER_ONLY", False),
+        max_body_chars=safe_int(os.getenv("MAX_BODY_CHARS"), 4000),
+        stream=env_bool("INGEST_STREAMING", False) if stream is None else stream,
+        text_parts_only=env_bool("IMAP_TEXT_PARTS_ONLY", True),
+        max_part_bytes=safe_int(os.getenv("MAX_PART_BYTES"), MAX_PART_BYTES),
+        max_text_chars=safe_int(os.getenv("MAX_TEXT_CHARS"), MAX_TEXT_CHARS),
+        max_message_bytes=safe_int(os.getenv("MAX_MESSAGE_BYTES"), MAX_MESSAGE_BYTES),
+        split_stories=env_bool("SPLIT_STORIES", True),
+        min_stories=max(2, safe_int(os.getenv("MIN_STORIES"), 3)),
+    )
+
+
+def _email_parser(settings: IngestSettings) -> Callable[[bytes], Optional[Dict[str, str]]]:
+    # A partial of a module-level function, so it also pickles for process pools.
+    return partial(
+        parse_email,
+        max_body_chars=settings.max_body_chars,
+        max_text_chars=settings.max_text_chars,
+        max_part_bytes=settings.max_part_bytes,
+        max_message_bytes=settings.max_message_bytes,
+    )
+
+
+def _ingest_mailbox(
+    session: ImapSession,
+    source: MailboxSource,
+    settings: IngestSettings,
+    budget: Optional["IngestBudget"] = None,
+) -> Tuple[int, int, List[str]]:
+    budget = budget or IngestBudget()
+    if budget.exhausted:
+        return 0, 0, []
     conn = get_connection()
-    init_db(conn)
+    try:
+        init_db(conn)
+        return _sync_mailbox(conn, session, source, settings, budget)
+    finally:
+        conn.close()
+
+
+def _sync_mailbox(
+    conn: sqlite3.Connection,
+    session: ImapSession,
+    source: MailboxSource,
+    settings: IngestSettings,
+    budget: "IngestBudget",
+) -> Tuple[int, int, List[str]]:
+    checkpoint_every = max(1, safe_int(os.getenv("INGEST_CHECKPOINT_EVERY"), 50))
+    mailbox_key = source.key
 
-    search_query = os.getenv("IMAP_SEARCH", "UNSEEN")
-    mark_seen = _env_bool("MARK_SEEN", False)
-    newsletter_only = _env_bool("NEWSLETTER_ONLY", False)
-    max_body_chars = _safe_int(os.getenv("MAX_BODY_CHARS"), 4000)
-    fetch_links = _env_bool("FETCH_LINKS", True)
-    max_links = _safe_int(os.getenv("MAX_LINKS_TO_FETCH"), 10)
-    interactive_links = _env_bool("INTERACTIVE_LINK_FETCH", True)
+    state = get_ingest_state(conn, "email", mailbox_key)
+    mailbox_state = session.take_mailbox_state()
+    last_uid = state["last_uid"]
+    resync = bool(
+        state["uidvalidity"]
+        and mailbox_state.uidvalidity
+        and state["uidvalidity"] != mailbox_state.uidvalidity
+    )
+    if resync:
+        # Every stored UID for this mailbox is meaningless now; drop them so
+        # they cannot collide with new UIDs, rescan and dedupe on
+        # Message-ID/content hash only.
+        print(
+            f"  [{mailbox_key}] UIDVALIDITY changed "
+            f"({state['uidvalidity']} -> {mailbox_state.uidvalidity}); resyncing"
+        )
+        clear_source_uids(conn, f"{mailbox_key}:")
+        last_uid = 0
+    elif state["uidvalidity"] and (
+        (mailbox_state.uidnext is not None and mailbox_state.uidnext <= last_uid + 1)
+        or (
+            mailbox_state.highestmodseq is not None
+            and mailbox_state.highestmodseq == state["highestmodseq"]
+        )
+    ):
+        # Nothing new since the checkpoint: skip UID SEARCH entirely.
+        return 0, 0, []
+
+    def _save_state(uid: int, complete: bool = True) -> None:
+        # HIGHESTMODSEQ only proves "nothing new" once the whole range is done.
+        set_ingest_state(
+            conn,
+            "email",
+            mailbox_key,
+            last_uid=uid,
+            uidvalidity=mailbox_state.uidvalidity,
+            highestmodseq=mailbox_state.highestmodseq if complete else None,
+        )
 
-    last_uid = get_last_uid(conn, "email", "INBOX")
     new_count = 0
     skipped = 0
     inspected_max_uid = last_uid
     new_content_ids: List[str] = []
+    seen_uids: List[int] = []
 
-    with ImapSession(mark_seen=mark_seen) as session:
-        uid_query = f"UID {last_uid + 1}:*"
-        if search_query:
-            uid_query = f"{uid_query} {search_query}"
-        uids = session.uid_search(uid_query)
-        if not uids:
-            return 0, 0, []
-
-        for uid in uids:
-            inspected_max_uid = max(inspected_max_uid, uid)
-            headers_raw = session.fetch_headers(uid)
-            if not headers_raw:
-                continue
-            message_id = session.extract_message_id(headers_raw)
-            source_uid = f"INBOX:{uid}"
+    uid_query = f"UID {last_uid + 1}:*"
+    if settings.search_query:
+        uid_query = f"{uid_query} {settings.search_query}"
+    # UID n:* always matches the highest existing UID, even if it is <= n.
+    uids = [uid for uid in session.uid_search(uid_query) if uid > last_uid]
+    if not uids:
+        _save_state(last_uid)
+        return 0, 0, []
 
-            if message_id and content_exists(conn, message_id=message_id):
-                skipped += 1
-                continue
-            if content_exists(conn, source_uid=source_uid):
-                skipped += 1
-                continue
+    headers_by_uid = session.fetch_headers_batch(uids)
+    message_ids = {
+        uid: session.extract_message_id(headers_raw)
+        for uid, headers_raw in headers_by_uid.items()
+    }
+    known_message_ids = existing_message_ids(conn, message_ids.values())
+    if resync:
+        remap_source_uids(
+            conn,
+            {
+                message_id: f"{mailbox_key}:{uid}"
+                for uid, message_id in message_ids.items()
+                if message_id in known_message_ids
+            },
+        )
+        known_source_uids: Set[str] = set()
+    else:
+        known_source_uids = existing_source_uids(
+            conn, (f"{mailbox_key}:{uid}" for uid in headers_by_uid)
+        )
 
-            raw = session.fetch_body(uid)
-            if not raw:
-                continue
+    prefilter = load_prefilter()
+    prefiltered = 0
+    pending: List[int] = []
+    for uid in uids:
+        inspected_max_uid = max(inspected_max_uid, uid)
+        if not headers_by_uid.get(uid):
+            continue
+        message_id = message_ids.get(uid)
 
-            parsed = parse_email(raw, max_body_chars=max_body_chars)
-            if not parsed:
-                skipped += 1
-                continue
+        if message_id and message_id in known_message_ids:
+            skipped += 1
+            continue
+        if f"{mailbox_key}:{uid}" in known_source_uids:
+            skipped += 1
+            continue
+        accepted, _ = evaluate(
+            prefilter,
+            header_summary(headers_by_uid[uid]),
+            newsletter_only=settings.newsletter_only,
+        )
+        if not accepted:
+            skipped += 1
+            prefiltered += 1
+            continue
+        pending.append(uid)
+    if prefiltered:
+        print(f"  [{mailbox_key}] Prefilter skipped {prefiltered} message(s) before download")
 
-            if newsletter_only and not is_newsletter(parsed):
-                skipped += 1
-                continue
+    if settings.stream:
+        parsed_items = _iter_bodies_streaming(
+            session,
+            pending,
+            _email_parser(settings),
+            chunk_size=safe_int(os.getenv("BODY_FETCH_CHUNK"), BODY_CHUNK_SIZE),
+            workers=safe_int(os.getenv("PARSE_WORKERS"), 4),
+            queue_size=safe_int(os.getenv("INGEST_QUEUE_SIZE"), 100),
+        )
+    else:
+        parsed_items = _iter_bodies_serial(session, pending, _email_parser(settings))
 
-            full_body = parsed.get("full_body", parsed.get("body", ""))
-            links = extract_links(full_body)
-            link_content = {}
-            if fetch_links and links:
-                link_content = fetch_links_interactive(
-                    links,
-                    subject=parsed.get("subject", ""),
-                    max_links=max_links,
-                    interactive=interactive_links,
+    # Parsed messages are kept in memory and written together with their
+    # checkpoint in one short transaction, so the write lock is never held
+    # while bodies are downloaded and other mailbox threads can write.
+    batch: List[Tuple[int, Optional[Dict[str, str]]]] = []
+    flush_failed = False
+
+    def _flush(uid: int, complete: bool = False) -> None:
+        nonlocal new_count, skipped, flush_failed
+        try:
+            for batch_uid, parsed in batch:
+                message_id = message_ids.get(batch_uid)
+                if message_id and message_id in known_message_ids:
+                    # Same Message-ID under several UIDs in one batch; the first
+                    # copy that was actually stored wins.
+                    skipped += 1
+                    continue
+                if parsed is None:
+                    continue
+                content_id, was_skipped = _store_parsed_email(
+                    conn,
+                    parsed,
+                    source_uid=f"{mailbox_key}:{batch_uid}",
+                    message_id=message_id,
+                    settings=settings,
+                    commit=False,
                 )
+                if message_id:
+                    known_message_ids.add(message_id)
+                if was_skipped:
+                    skipped += 1
+                elif content_id:
+                    new_count += 1
+                    new_content_ids.append(content_id)
+                    if settings.mark_seen:
+                        seen_uids.append(batch_uid)
+            _save_state(uid, complete=complete)
+        except BaseException:
+            # Nothing of a failed batch is kept, and its checkpoint is not saved.
+            flush_failed = True
+            conn.rollback()
+            raise
+        batch.clear()
 
-            payload = {
-                "source_type": "email",
-                "source_uid": source_uid,
-                "message_id": message_id,
-                "subject": parsed.get("subject"),
-                "sender": parsed.get("from"),
-                "date": parsed.get("date"),
-                "extracted_text": full_body,
-            }
-            content_id = compute_content_id(
-                {
-                    "source_type": payload["source_type"],
-                    "subject": payload["subject"],
-                    "sender": payload["sender"],
-                    "date": payload["date"],
-                    "extracted_text": payload["extracted_text"],
-                }
-            )
-            if content_exists(conn, content_id=content_id):
-                skipped += 1
+    checkpoint_uid = last_uid
+    complete = False
+    try:
+        for uid, parsed in parsed_items:
+            if not budget.take():
+                break
+            batch.append((uid, parsed))
+            # Bodies arrive in UID order, so everything up to this UID is done.
+            checkpoint_uid = uid
+            if len(batch) >= checkpoint_every:
+                _flush(checkpoint_uid)
+        else:
+            checkpoint_uid = inspected_max_uid
+            complete = True
+    finally:
+        close = getattr(parsed_items, "close", None)
+        if close:
+            close()
+        # Writes the last batch together with its checkpoint, also on Ctrl-C
+        # or a dropped connection.
+        if not flush_failed:
+            _flush(checkpoint_uid, complete=complete)
+
+    # Flags are stored after the body stream finishes so the download
+    # thread is the only user of the socket while it runs.
+    if seen_uids and not session.broken:
+        session.mark_seen_batch(seen_uids)
+
+    return new_count, skipped, new_content_ids
+
+
+def _store_parsed_email(
+    conn: sqlite3.Connection,
+    parsed: Dict[str, str],
+    *,
+    source_uid: Optional[str],
+    message_id: Optional[str],
+    settings: IngestSettings,
+    commit: bool = True,
+) -> Tuple[Optional[str], bool]:
+    """Insert one parsed email.
+
+    ``newsletter_only`` and the filters.yaml rules are applied to headers by
+    ``prefilter.evaluate`` before download, so an allowed sender is kept
+    here even if it does not look like a newsletter. Links are only
+    extracted here; their content is fetched later by the enrichment stage
+    (see ``enrich_items``). Returns ``(content_id, skipped)``;
+    ``content_id`` is set only when a new row was written.
+    """
+
+    full_body = parsed.get("full_body", parsed.get("body", ""))
+    if parsed.get("links") is not None:
+        links = filter_links(parsed["links"])
+    else:
+        links = extract_links(full_body)
+
+    payload = {
+        "source_type": "email",
+        "source_uid": source_uid,
+        "message_id": message_id,
+        "subject": parsed.get("subject"),
+        "sender": parsed.get("from"),
+        "date": parsed.get("date"),
+        "extracted_text": full_body,
+    }
+    content_id = compute_content_id(
+        {
+            "source_type": payload["source_type"],
+            "subject": payload["subject"],
+            "sender": payload["sender"],
+            "date": payload["date"],
+            "extracted_text": payload["extracted_text"],
+        }
+    )
+    if content_exists(conn, content_id=content_id):
+        return None, True
+
+    stories = split_stories(full_body, min_stories=settings.min_stories) if settings.split_stories else []
+    created_at = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+    stored = insert_content_item(
+        conn,
+        {
+            **payload,
+            "content_id": content_id,
+            "links_json": json.dumps(links),
+            # NULL marks the links as not fetched yet. A split parent is never
+            # summarized itself, so only its stories are left to enrich.
+            "link_content_json": None if links and not stories else "{}",
+            "created_at": created_at,
+        },
+        commit=False,
+    )
+    if not stored:
+        # Lost to a duplicate Message-ID or source_uid already in the table.
+        return None, True
+    if stories:
+        _store_stories(conn, payload, content_id, stories, created_at)
+    if commit:
+        conn.commit()
+    return content_id, False
+
+
+def _store_stories(
+    conn: sqlite3.Connection,
+    payload: Dict[str, Optional[str]],
+    parent_id: str,
+    stories: List[Story],
+    created_at: str,
+) -> int:
+    """Store each story of a digest newsletter as a child item of the parent.
+
+    The parent row stays the dedupe anchor (Message-ID, source UID); digests
+    use its stories in its place.
+    """
+    for index, story in enumerate(stories):
+        child = {
+            "source_type": "email_story",
+            "subject": story.title,
+            "sender": payload.get("sender"),
+            "date": payload.get("date"),
+            "extracted_text": story.text,
+        }
+        insert_content_item(
+            conn,
+            {
+                **child,
+                "content_id": compute_content_id({**child, "parent_id": parent_id, "story_index": index}),
+                "links_json": json.dumps(story.links),
+                "link_content_json": None,
+                "created_at": created_at,
+                "parent_id": parent_id,
+                "story_index": index,
+            },
+            commit=False,
+        )
+    return len(stories)
+
+
+def _new_session(
+    account: MailAccount,
+    settings: IngestSettings,
+    mailbox: str = "INBOX",
+) -> ImapSession:
+    return ImapSession(
+        mailbox,
+        mark_seen=settings.mark_seen,
+        user_env=account.user_env,
+        password_env=account.password_env,
+        host=account.host,
+        port=account.port,
+        use_tls=account.tls,
+        text_parts_only=settings.text_parts_only,
+        max_part_bytes=settings.max_part_bytes,
+    )
+
+
+def ingest_emails(
+    stream: Optional[bool] = None,
+    *,
+    max_messages: Optional[int] = None,
+    time_budget: Optional[float] = None,
+) -> Tuple[int, int, List[str]]:
+    conn = get_connection()
+    init_db(conn)
+    conn.close()
+
+    settings = _ingest_settings(stream)
+    sources = mailbox_sources(load_accounts())
+    if not sources:
+        return 0, 0, []
+
+    budget = IngestBudget(max_messages=max_messages, time_budget=time_budget)
+    pool = ImapSessionPool(lambda account: _new_session(account, settings))
+
+    def _sync(source: MailboxSource) -> Tuple[int, int, List[str]]:
+        with pool.session(source.account, source.mailbox) as session:
+            return _ingest_mailbox(session, source, settings, budget)
+
+    new_count = 0
+    skipped = 0
+    new_content_ids: List[str] = []
+    workers = min(len(sources), max(1, safe_int(os.getenv("INGEST_MAILBOX_WORKERS"), 4)))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [(source, executor.submit(_sync, source)) for source in sources]
+        for source, future in futures:
+            try:
+                added, passed, content_ids = future.result()
+            except KeyboardInterrupt:
+                raise
+            except Exception as exc:
+                if len(sources) == 1:
+                    raise
+                print(f"  Warning: Failed to ingest {source.key} - {str(exc)[:80]}")
                 continue
+            new_count += added
+            skipped += passed
+            new_content_ids.extend(content_ids)
+    except KeyboardInterrupt:
+        # Let every worker checkpoint what it has finished before exiting.
+        budget.cancel()
+        print("\nInterrupted; saving checkpoints...")
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        pool.close()
+
+    if budget.exhausted and (max_messages is not None or time_budget):
+        print("Stopped at the ingest budget; run again to continue from the checkpoint.")
+    return new_count, skipped, new_content_ids
+
+
+def _import_chunk(
+    conn: sqlite3.Connection,
+    chunk: List[Tuple[str, bytes]],
+    executor: ProcessPoolExecutor,
+    settings: IngestSettings,
+    prefilter: Optional[PrefilterRules],
+) -> Tuple[int, int, List[str]]:
+    message_ids = [extract_message_id(raw) for _, raw in chunk]
+    known_message_ids = existing_message_ids(conn, message_ids)
+    known_source_uids = existing_source_uids(conn, (source_uid for source_uid, _ in chunk))
+
+    skipped = 0
+    pending: List[Tuple[str, Optional[str], bytes]] = []
+    for (source_uid, raw), message_id in zip(chunk, message_ids):
+        if (message_id and message_id in known_message_ids) or source_uid in known_source_uids:
+            skipped += 1
+            continue
+        accepted, _ = evaluate(
+            prefilter,
+            header_summary(header_block(raw)),
+            newsletter_only=settings.newsletter_only,
+        )
+        if not accepted:
+            skipped += 1
+            continue
+        pending.append((source_uid, message_id, raw))
+
+    new_count = 0
+    new_content_ids: List[str] = []
+    parsed_items = executor.map(
+        _email_parser(settings),
+        [raw for _, _, raw in pending],
+        chunksize=8,
+    )
+    for (source_uid, message_id, _), parsed in zip(pending, parsed_items):
+        if not parsed or (message_id and message_id in known_message_ids):
+            skipped += 1
+            continue
+        content_id, was_skipped = _store_parsed_email(
+            conn,
+            parsed,
+            source_uid=source_uid,
+            message_id=message_id,
+            settings=settings,
+            commit=False,
+        )
+        if message_id:
+            # Later copies in this chunk are duplicates of a stored message.
+            known_message_ids.add(message_id)
+        if was_skipped:
+            skipped += 1
+        elif content_id:
+            new_count += 1
+            new_content_ids.append(content_id)
+    conn.commit()
+    return new_count, skipped, new_content_ids
 
-            stored = insert_content_item(
-                conn,
-                {
-                    **payload,
-                    "content_id": content_id,
-                    "links_json": json.dumps(links),
-                    "link_content_json": json.dumps(link_content),
-                    "created_at": datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
-                },
-            )
-            if stored:
-                new_count += 1
-                new_content_ids.append(content_id)
 
-            if mark_seen:
-                session.mark_seen(uid)
+def import_archives(
+    paths: List[str],
+    *,
+    workers: Optional[int] = None,
+    fetch_links: bool = False,
+    max_messages: Optional[int] = None,
+) -> Tuple[int, int, List[str]]:
+    """Backfill the store from mbox files, Maildir trees or .eml folders.
+
+    Headers are deduped in bulk against the store in the main process and
+    the remaining bodies are parsed across a process pool. Items get the
+    same content_id as IMAP ingest, so archives and live mail never
+    duplicate each other.
+    """
+    conn = get_connection()
+    init_db(conn)
+
+    settings = _ingest_settings(stream=False)
+    chunk_size = max(1, safe_int(os.getenv("IMPORT_CHUNK_SIZE"), 200))
+    prefilter = load_prefilter()
+    url_cache_stats.reset()
+
+    new_count = 0
+    skipped = 0
+    seen = 0
+    new_content_ids: List[str] = []
+    chunk: List[Tuple[str, bytes]] = []
 
-        if inspected_max_uid > last_uid:
-            set_last_uid(conn, "email", "INBOX", inspected_max_uid)
+    def _flush() -> None:
+        nonlocal new_count, skipped
+        added, passed, content_ids = _import_chunk(conn, chunk, executor, settings, prefilter)
+        if fetch_links and content_ids:
+            enrich_items(conn, _expand_stories(conn, get_content_items_by_ids(conn, content_ids)), interactive=False)
+        new_count += added
+        skipped += passed
+        new_content_ids.extend(content_ids)
+        chunk.clear()
 
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            for path in paths:
+                if max_messages is not None and seen >= max_messages:
+                    break
+                for source_uid, raw in iter_archive_messages(path):
+                    if max_messages is not None and seen >= max_messages:
+                        break
+                    seen += 1
+                    chunk.append((source_uid, raw))
+                    if len(chunk) >= chunk_size:
+                        _flush()
+            if chunk:
+                _flush()
+    finally:
+        conn.commit()
+        conn.close()
+
+    cache_summary = url_cache_stats.summary()
+    if cache_summary:
+        print(cache_summary)
     return new_count, skipped, new_content_ids
 
 
+def _watch_mailbox(
+    source: MailboxSource,
+    settings: IngestSettings,
+    stop: threading.Event,
+    *,
+    idle_timeout: float,
+    max_backoff: float,
+) -> None:
+    backoff = 1.0
+    while not stop.is_set():
+        session = _new_session(source.account, settings, source.mailbox)
+        try:
+            with session:
+                backoff = 1.0
+                changed = True
+                while not stop.is_set():
+                    if changed:
+                        added, passed, _ = _ingest_mailbox(session, source, settings)
+                        if added or passed:
+                            print(f"[{source.key}] Ingested: {added}, Skipped: {passed}")
+                        if session.broken:
+                            break  # reconnect on a fresh socket
+                    changed = session.idle(timeout=idle_timeout)
+                    if not changed:
+                        session.noop()
+        except (imaplib.IMAP4.abort, imaplib.IMAP4.error, OSError) as exc:
+            if stop.is_set():
+                break
+            delay = backoff + random.random()
+            print(f"  Warning: [{source.key}] connection lost ({str(exc)[:60]}); retrying in {delay:.0f}s")
+            stop.wait(delay)
+            backoff = min(backoff * 2, max_backoff)
+
+
+def watch_emails(stream: Optional[bool] = None, stop: Optional[threading.Event] = None) -> None:
+    """Keep one IDLE connection per mailbox and ingest new UIDs as they arrive.
+
+    Runs until ``stop`` is set or the process is interrupted. Dropped
+    connections are re-established with exponential backoff.
+    """
+    conn = get_connection()
+    init_db(conn)
+    conn.close()
+
+    settings = _ingest_settings(stream)
+    sources = mailbox_sources(load_accounts())
+    if not sources:
+        return
+    stop = stop or threading.Event()
+    idle_timeout = float(safe_int(os.getenv("IDLE_TIMEOUT_SECONDS"), IDLE_TIMEOUT))
+    max_backoff = float(safe_int(os.getenv("WATCH_MAX_BACKOFF_SECONDS"), 300))
+
+    threads = [
+        threading.Thread(
+            target=_watch_mailbox,
+            args=(source, settings, stop),
+            kwargs={"idle_timeout": idle_timeout, "max_backoff": max_backoff},
+            name=f"imap-idle-{source.key}",
+            daemon=True,
+        )
+        for source in sources
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads) and not stop.is_set():
+            stop.wait(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+
+
+def enrich_items(
+    conn: sqlite3.Connection,
+    items: List[Dict[str, str]],
+    *,
+    interactive: bool = False,
+) -> int:
+    """Fetch link content for items that have not been enriched yet.
+
+    The result is stored in ``link_content_json`` and set on the item dicts
+    in place. Each item is committed on its own, so no write transaction is
+    held across a fetch. Returns the number of items enriched.
+    """
+    max_links = safe_int(os.getenv("MAX_LINKS_TO_FETCH"), 10)
+    enriched = 0
+    for item in items:
+        if item.get("link_content_json") is not None:
+            continue
+        try:
+            links = json.loads(item.get("links_json") or "[]")
+        except json.JSONDecodeError:
+            links = []
+        link_content: Dict[str, str] = {}
+        if links:
+            link_content = fetch_links_interactive(
+                links,
+                subject=item.get("subject") or "",
+                max_links=max_links,
+                interactive=interactive,
+                conn=conn,
+            )
+        set_link_content(conn, item["content_id"], link_content)
+        item["link_content_json"] = json.dumps(link_content)
+        enriched += 1
+    return enriched
+
+
+def enrich_content(
+    *,
+    since_hours: Optional[int] = None,
+    max_items: Optional[int] = None,
+    interactive: Optional[bool] = None,
+) -> int:
+    """Enrichment stage: fetch links for stored items still waiting for it.
+
+    Digest builds enrich the items they need on demand, so running this
+    ahead of time (e.g. from cron after ``ingest``) only moves the fetch
+    latency out of the digest build.
+    """
+    conn = get_connection()
+    init_db(conn)
+    if interactive is None:
+        interactive = env_bool("INTERACTIVE_LINK_FETCH", True)
+    url_cache_stats.reset()
+    try:
+        enriched = enrich_items(
+            conn,
+            get_unenriched_items(conn, since_hours=since_hours, max_items=max_items),
+            interactive=interactive,
+        )
+    finally:
+        conn.close()
+    cache_summary = url_cache_stats.summary()
+    if cache_summary:
+        print(cache_summary)
+    return enriched
+
+
 def ensure_ai_cache_for_item(item: Dict[str, str]) -> Dict[str, str]:
     conn = get_connection()
     init_db(conn)
@@ -210,13 +952,32 @@ def ensure_ai_cache_for_item(item: Dict[str, str]) -> Dict[str, str]:
                 topic_tags = []
                 topic_tags_cached = False
 
-    prompt_text = _build_prompt_text(item, _safe_int(os.getenv("MAX_BODY_CHARS"), 4000))
+    missing_summary = summary is None or summary.strip() == ""
+    missing_category = category is None or category.strip() == ""
+    prompt_text = ""
+    if missing_summary or missing_category or not topic_tags_cached:
+        prompt_item = item
+        learner = get_boilerplate_learner()
+        if learner is not None:
+            # Drop the sender's recurring header/footer/sponsor lines before
+            # truncation, so more of the actual issue fits in the prompt.
+            prompt_item = {**item, "extracted_text": learner.strip(conn, item)}
+        prompt_text = _build_prompt_text(prompt_item, safe_int(os.getenv("MAX_BODY_CHARS"), 4000))
 
-    if summary is None or summary.strip() == "":
+    if missing_summary + missing_category + (not topic_tags_cached) > 1:
+        # One combined call instead of resending the body once per field.
+        analysis = analyze_content(item, prompt_text)
+        if missing_summary:
+            summary = analysis["summary_md"]
+        if missing_category:
+            category = analysis["category"]
+        if not topic_tags_cached:
+            topic_tags = analysis["topic_tags"]
+    elif missing_summary:
         summary = summarize_content(item, prompt_text)
-    if category is None or category.strip() == "":
+    elif missing_category:
         category = classify_category(item, prompt_text)
-    if not topic_tags_cached:
+    elif not topic_tags_cached:
         topic_tags = tag_topics(item, prompt_text)
 
     upsert_ai_cache(
@@ -234,48 +995,105 @@ def ensure_ai_cache_for_item(item: Dict[str, str]) -> Dict[str, str]:
     }
 
 
+def _role_accepts(role: Role, category: str, topic_tags: Iterable[str]) -> bool:
+    if role.focus_categories and category not in role.focus_categories:
+        return False
+    focus_topics = [topic.lower() for topic in role.focus_topics]
+    if focus_topics:
+        item_tags = [str(tag).lower() for tag in topic_tags]
+        if not any(tag in focus_topics for tag in item_tags):
+            return False
+    return True
+
+
 def ensure_role_cache_for_item(
     item: Dict[str, str],
     role: Role,
     ai_cache: Dict[str, str],
+    roles: Optional[List[Role]] = None,
 ) -> Dict[str, str]:
+    """Role angles for ``role``, from ``role_cache`` or generated.
+
+    Angles for the other ``roles`` that lack a cached row (and whose focus
+    filters accept the item) are generated in the same model call and
+    cached together, so later builds for those roles hit the cache.
+    """
     conn = get_connection()
     init_db(conn)
 
-    cached = get_role_cache(conn, item["content_id"], role.name)
-    if cached:
+    candidates = [role] + [
+        other
+        for other in roles or []
+        if other.name != role.name and _role_accepts(other, ai_cache["category"], ai_cache["topic_tags"])
+    ]
+    cached = get_role_caches(conn, item["content_id"], [candidate.name for candidate in candidates])
+    if role.name in cached:
         return {
-            "startup_angle": cached.get("startup_angle", ""),
-            "role_angle": cached.get("role_angle", ""),
+            "startup_angle": cached[role.name].get("startup_angle", ""),
+            "role_angle": cached[role.name].get("role_angle", ""),
         }
 
-    startup_angle, role_angle = generate_role_angles(
+    angles = generate_multi_role_angles(
         item=item,
         summary_md=ai_cache["summary_md"],
         category=ai_cache["category"],
         topic_tags=ai_cache["topic_tags"],
-        role=role,
-    )
-    insert_role_cache(
-        conn,
-        content_id=item["content_id"],
-        role_name=role.name,
-        startup_angle=startup_angle,
-        role_angle=role_angle,
+        roles=[candidate for candidate in candidates if candidate.name not in cached],
     )
+    insert_role_caches(conn, content_id=item["content_id"], angles=angles)
+    startup_angle, role_angle = angles[role.name]
     return {
         "startup_angle": startup_angle,
         "role_angle": role_angle,
     }
 
 
+def _expand_stories(conn: sqlite3.Connection, items: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Replace split newsletters with their story items, keeping order."""
+    stories = get_story_items(conn, [item["content_id"] for item in items if not item.get("parent_id")])
+    expanded: List[Dict[str, str]] = []
+    seen: Set[str] = set()
+    for item in items:
+        if item.get("parent_id") in stories:
+            continue  # emitted in story order with its parent
+        for unit in stories.get(item["content_id"]) or [item]:
+            if unit["content_id"] not in seen:
+                seen.add(unit["content_id"])
+                expanded.append(unit)
+    return expanded
+
+
+def _digest_entry(item: Dict[str, str], *, role: Role, roles: Optional[List[Role]]) -> Optional[Dict[str, str]]:
+    ai_cache = ensure_ai_cache_for_item(item)
+    if not _role_accepts(role, ai_cache["category"], ai_cache["topic_tags"]):
+        return None
+    role_cache = ensure_role_cache_for_item(item, role, ai_cache, roles)
+
+    topic_tags = ai_cache.get("topic_tags") or []
+    domain_tag = _domain_tag_from_topics(topic_tags)
+
+    return {
+        "content_id": item["content_id"],
+        "subject": item.get("subject") or "(no subject)",
+        "category": ai_cache["category"],
+        "summary_md": ai_cache["summary_md"],
+        "topic_tags": topic_tags,
+        "domain_tag": domain_tag,
+        "startup_angle": role_cache["startup_angle"],
+        "role_angle": role_cache["role_angle"],
+    }
+
+
 def build_digest_items(
     role: Role,
     *,
     content_ids: Optional[List[str]] = None,
     since_hours: Optional[int] = None,
     max_items: Optional[int] = None,
+    roles: Optional[List[Role]] = None,
 ) -> List[Dict[str, str]]:
+    """Digest entries for ``role``. Angles for the other ``roles`` (usually
+    every enabled role) are generated alongside and cached."""
     conn = get_connection()
     init_db(conn)
 
@@ -283,40 +1101,24 @@ def build_digest_items(
         items = get_content_items_by_ids(conn, content_ids)
     else:
         items = get_content_items(conn, since_hours=since_hours, max_items=max_items)
-    digest_items: List[Dict[str, str]] = []
-
-    for item in items:
-        ai_cache = ensure_ai_cache_for_item(item)
-        role_cache = ensure_role_cache_for_item(item, role, ai_cache)
-
-        topic_tags = ai_cache.get("topic_tags") or []
-        domain_tag = _domain_tag_from_topics(topic_tags)
-
-        digest_items.append(
-            {
-                "content_id": item["content_id"],
-                "subject": item.get("subject") or "(no subject)",
-                "category": ai_cache["category"],
-                "summary_md": ai_cache["summary_md"],
-                "topic_tags": topic_tags,
-                "domain_tag": domain_tag,
-                "startup_angle": role_cache["startup_angle"],
-                "role_angle": role_cache["role_angle"],
-            }
-        )
-
-    filtered: List[Dict[str, str]] = []
-    focus_topics = [topic.lower() for topic in role.focus_topics]
-    for item in digest_items:
-        if role.focus_categories and item["category"] not in role.focus_categories:
-            continue
-        if focus_topics:
-            item_tags = [str(tag).lower() for tag in item.get("topic_tags", [])]
-            if not any(tag in focus_topics for tag in item_tags):
-                continue
-        filtered.append(item)
-
-    return filtered
+    items = _expand_stories(conn, items)
+    if max_items is not None:
+        # A split newsletter expands into many stories; cap digest entries
+        # (and model calls) at what was asked for.
+        items = items[:max_items]
+    if env_bool("FETCH_LINKS", True):
+        # Only items that still need a summary use link content; fetch theirs now.
+        enrich_items(conn, [item for item in items if get_ai_cache(conn, item["content_id"]) is None])
+    workers = max(1, safe_int(os.getenv("LLM_CONCURRENCY"), LLM_CONCURRENCY))
+    build = partial(_digest_entry, role=role, roles=roles)
+    if workers == 1 or len(items) <= 1:
+        entries = [build(item) for item in items]
+    else:
+        # Model calls are independent per item and share the rate limiter in
+        # agent_pipeline; map() keeps the digest in item order.
+        with ThreadPoolExecutor(max_workers=min(workers, len(items)), thread_name_prefix="llm") as executor:
+            entries = list(executor.map(build, items))
+    return [entry for entry in entries if entry is not None]
 
 
 def format_digest_markdown(items: List[Dict[str, str]], role_name: str) -> str:
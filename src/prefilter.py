@@ -0,0 +1,124 @@
+import email.parser
+import fnmatch
+import os
+import re
+from dataclasses import dataclass, field
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Pattern, Tuple
+
+import yaml
+
+from .email_parse import decode_subject, is_newsletter
+
+
+@dataclass
+class PrefilterRules:
+    allow_senders: List[str] = field(default_factory=list)
+    deny_senders: List[str] = field(default_factory=list)
+    allow_list_ids: List[str] = field(default_factory=list)
+    deny_list_ids: List[str] = field(default_factory=list)
+    allow_subjects: List[Pattern[str]] = field(default_factory=list)
+    deny_subjects: List[Pattern[str]] = field(default_factory=list)
+    accept_list_headers: bool = True
+    default_accept: bool = True
+
+
+def _lower_list(values) -> List[str]:
+    return [str(value).strip().lower() for value in (values or []) if str(value).strip()]
+
+
+def load_prefilter(path: Optional[str] = None) -> Optional[PrefilterRules]:
+    path = path or os.getenv("PREFILTER_PATH", "filters.yaml")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as handle:
+        raw = yaml.safe_load(handle) or {}
+
+    senders = raw.get("senders") or {}
+    list_ids = raw.get("list_ids") or {}
+    subjects = raw.get("subjects") or {}
+    return PrefilterRules(
+        allow_senders=_lower_list(senders.get("allow")),
+        deny_senders=_lower_list(senders.get("deny")),
+        allow_list_ids=_lower_list(list_ids.get("allow")),
+        deny_list_ids=_lower_list(list_ids.get("deny")),
+        allow_subjects=[re.compile(p, re.IGNORECASE) for p in subjects.get("allow") or []],
+        deny_subjects=[re.compile(p, re.IGNORECASE) for p in subjects.get("deny") or []],
+        accept_list_headers=bool(raw.get("accept_list_headers", True)),
+        default_accept=str(raw.get("default", "accept")).strip().lower() != "reject",
+    )
+
+
+def header_summary(headers_raw: bytes) -> Dict[str, str]:
+    """Decode the fields the prefilter and is_newsletter look at."""
+    msg = email.parser.BytesHeaderParser().parsebytes(headers_raw or b"")
+    return {
+        "subject": decode_subject(str(msg.get("Subject", "(no subject)"))),
+        "from": str(msg.get("From", "")),
+        "list_id": str(msg.get("List-ID", "")),
+        "list_unsubscribe": str(msg.get("List-Unsubscribe", "")),
+    }
+
+
+def _sender_matches(address: str, patterns: List[str]) -> bool:
+    if not address:
+        return False
+    domain = address.rsplit("@", 1)[-1]
+    for pattern in patterns:
+        if pattern.startswith("@"):
+            if address.endswith(pattern):
+                return True
+        elif "@" in pattern:
+            if address == pattern:
+                return True
+        elif domain == pattern or domain.endswith("." + pattern):
+            return True
+    return False
+
+
+def _list_id_matches(list_id: str, patterns: List[str]) -> bool:
+    if not list_id:
+        return False
+    value = list_id.strip().lower()
+    bare = value[value.find("<") + 1 : value.rfind(">")] if "<" in value else value
+    return any(fnmatch.fnmatch(bare, p) or fnmatch.fnmatch(value, p) for p in patterns)
+
+
+def evaluate(
+    rules: Optional[PrefilterRules],
+    headers: Dict[str, str],
+    *,
+    newsletter_only: bool = False,
+) -> Tuple[bool, str]:
+    """Decide from headers alone whether a message is worth downloading.
+
+    Deny rules win over allow rules; allow rules win over ``newsletter_only``
+    and the default action.
+    """
+    address = parseaddr(headers.get("from", ""))[1].lower()
+    subject = headers.get("subject", "")
+    list_id = headers.get("list_id", "")
+
+    if rules:
+        if _sender_matches(address, rules.deny_senders):
+            return False, "sender denied"
+        if _list_id_matches(list_id, rules.deny_list_ids):
+            return False, "list-id denied"
+        if any(p.search(subject) for p in rules.deny_subjects):
+            return False, "subject denied"
+        if _sender_matches(address, rules.allow_senders):
+            return True, "sender allowed"
+        if _list_id_matches(list_id, rules.allow_list_ids):
+            return True, "list-id allowed"
+        if any(p.search(subject) for p in rules.allow_subjects):
+            return True, "subject allowed"
+        if rules.accept_list_headers and (list_id or headers.get("list_unsubscribe")):
+            return True, "mailing-list headers"
+
+    if newsletter_only:
+        if is_newsletter(headers):
+            return True, "newsletter"
+        return False, "not a newsletter"
+    if rules and not rules.default_accept:
+        return False, "default reject"
+    return True, "default"
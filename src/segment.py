@@ -0,0 +1,91 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from .link_fetcher import is_valuable_url
+from .url_canon import canonical_url
+
+
+# "Headline text https://..." as rendered from an <a> by email_parse, or a
+# markdown-style "[Headline](https://...)" line from text/plain bodies.
+_INLINE_HEADLINE_RE = re.compile(r"^(?P<title>\S.{6,200}?)\s+(?P<url>https?://\S+)$")
+_MARKDOWN_HEADLINE_RE = re.compile(r"^\[(?P<title>[^\]]{7,200})\]\((?P<url>https?://[^)\s]+)\)$")
+_URL_ONLY_RE = re.compile(r"^<?(?P<url>https?://\S+?)>?$")
+_URL_RE = re.compile(r"https?://[^\s<>\"{}|\\^`\[\]()]+")
+
+MIN_STORY_CHARS = 60
+
+
+@dataclass
+class Story:
+    title: str
+    url: str
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n".join([self.title, *self.lines]).strip()
+
+    @property
+    def links(self) -> List[str]:
+        links = [self.url]
+        for line in self.lines:
+            for url in _URL_RE.findall(line):
+                url = canonical_url(url)
+                if url not in links and is_valuable_url(url):
+                    links.append(url)
+        return links
+
+
+def _headline(lines: List[str], index: int) -> Optional[Tuple[str, str, int]]:
+    """Return ``(title, url, lines_consumed)`` if a story starts at ``index``."""
+    line = lines[index]
+    match = _INLINE_HEADLINE_RE.match(line) or _MARKDOWN_HEADLINE_RE.match(line)
+    if match and "http" not in match.group("title"):
+        return match.group("title").strip(), match.group("url"), 1
+    # Plain-text layout: a short title line followed by a bare URL line.
+    if index + 1 < len(lines) and len(line) <= 200 and "http" not in line:
+        url_match = _URL_ONLY_RE.match(lines[index + 1])
+        if url_match:
+            return line.strip(), url_match.group("url"), 2
+    return None
+
+
+def _is_prose(line: str) -> bool:
+    return len(line.split()) >= 4 and not line.startswith(("http://", "https://"))
+
+
+def split_stories(text: str, *, min_stories: int = 3) -> List[Story]:
+    """Split a digest newsletter body into stories at headline+link lines.
+
+    A headline only opens a story when prose follows it, which skips nav bars
+    and link lists. Headlines linking to ads, sponsors or other excluded URLs
+    close the current story and are dropped with their text. Returns [] when
+    fewer than ``min_stories`` stories are found, so ordinary single-topic
+    emails are left whole.
+    """
+    lines = [line.strip() for line in (text or "").splitlines() if line.strip()]
+    stories: List[Story] = []
+    current: Optional[Story] = None
+    index = 0
+    while index < len(lines):
+        found = _headline(lines, index)
+        if found:
+            title, url, consumed = found
+            url = canonical_url(url)
+            if not is_valuable_url(url) or "(sponsor)" in title.lower():
+                current = None
+                index += consumed
+                continue
+            following = lines[index + consumed] if index + consumed < len(lines) else ""
+            if _is_prose(following) and not _headline(lines, index + consumed):
+                current = Story(title=title, url=url)
+                stories.append(current)
+                index += consumed
+                continue
+        if current is not None:
+            current.lines.append(lines[index])
+        index += 1
+
+    kept = [story for story in stories if len(story.text) >= MIN_STORY_CHARS]
+    return kept if len(kept) >= min_stories else []
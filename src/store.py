@@ -4,10 +4,12 @@ import os
 import sqlite3
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 
 DEFAULT_DB_PATH = os.getenv("STORE_PATH", "out/store.db")
+# Stay well under SQLite's default host-parameter limit for IN (...) lookups.
+BULK_QUERY_CHUNK = 500
 
 
 def _utc_now() -> str:
@@ -17,8 +19,12 @@ def _utc_now() -> str:
 def get_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
     path = Path(db_path or DEFAULT_DB_PATH)
     path.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(path))
+    # Mailbox syncs run on separate threads with their own connections;
+    # WAL plus a busy timeout lets their short write transactions interleave.
+    conn = sqlite3.connect(str(path), timeout=30)
     conn.row_factory = sqlite3.Row
+    if str(path) != ":memory:":
+        conn.execute("PRAGMA journal_mode=WAL")
     return conn
 
 
@@ -57,6 +63,32 @@ def init_db(conn: sqlite3.Connection) -> None:
             PRIMARY KEY(content_id, role_name)
         );
 
+        CREATE TABLE IF NOT EXISTS url_cache (
+            url TEXT PRIMARY KEY,
+            status TEXT,
+            content TEXT,
+            fetched_at TEXT,
+            expires_at TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS url_redirects (
+            url TEXT PRIMARY KEY,
+            target TEXT,
+            resolved_at TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS domain_health (
+            domain TEXT PRIMARY KEY,
+            requests INTEGER,
+            failures INTEGER,
+            timeouts INTEGER,
+            consecutive_failures INTEGER,
+            total_seconds REAL,
+            open_until TEXT,
+            last_error TEXT,
+            updated_at TEXT
+        );
+
         CREATE TABLE IF NOT EXISTS ingest_state (
             source_type TEXT,
             mailbox TEXT,
@@ -66,6 +98,17 @@ def init_db(conn: sqlite3.Connection) -> None:
         );
         """
     )
+    _ensure_columns(
+        conn,
+        "ingest_state",
+        {"uidvalidity": "INTEGER", "highestmodseq": "INTEGER"},
+    )
+    _ensure_columns(
+        conn,
+        "content_items",
+        {"parent_id": "TEXT", "story_index": "INTEGER"},
+    )
+    _ensure_columns(conn, "url_cache", {"etag": "TEXT", "last_modified": "TEXT"})
     conn.execute(
         "CREATE UNIQUE INDEX IF NOT EXISTS idx_content_message_id "
         "ON content_items(message_id) WHERE message_id IS NOT NULL"
@@ -78,9 +121,28 @@ def init_db(conn: sqlite3.Connection) -> None:
         "CREATE INDEX IF NOT EXISTS idx_content_created_at "
         "ON content_items(created_at)"
     )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_content_sender "
+        "ON content_items(sender, created_at)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_content_parent_id "
+        "ON content_items(parent_id) WHERE parent_id IS NOT NULL"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_content_unenriched "
+        "ON content_items(created_at) WHERE link_content_json IS NULL"
+    )
     conn.commit()
 
 
+def _ensure_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]) -> None:
+    existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, column_type in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+
 def compute_content_id(payload: Dict[str, Any]) -> str:
     canonical = json.dumps(payload, sort_keys=True, ensure_ascii=True)
     return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
@@ -94,6 +156,46 @@ def get_last_uid(conn: sqlite3.Connection, source_type: str, mailbox: str) -> in
     return int(row["last_uid"]) if row and row["last_uid"] is not None else 0
 
 
+def get_ingest_state(conn: sqlite3.Connection, source_type: str, mailbox: str) -> Dict[str, Any]:
+    row = conn.execute(
+        "SELECT last_uid, uidvalidity, highestmodseq FROM ingest_state "
+        "WHERE source_type=? AND mailbox=?",
+        (source_type, mailbox),
+    ).fetchone()
+    if not row:
+        return {"last_uid": 0, "uidvalidity": None, "highestmodseq": None}
+    return {
+        "last_uid": int(row["last_uid"] or 0),
+        "uidvalidity": row["uidvalidity"],
+        "highestmodseq": row["highestmodseq"],
+    }
+
+
+def set_ingest_state(
+    conn: sqlite3.Connection,
+    source_type: str,
+    mailbox: str,
+    *,
+    last_uid: int,
+    uidvalidity: Optional[int] = None,
+    highestmodseq: Optional[int] = None,
+) -> None:
+    conn.execute(
+        """
+        INSERT INTO ingest_state(source_type, mailbox, last_uid, uidvalidity, highestmodseq, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(source_type, mailbox)
+        DO UPDATE SET
+            last_uid=excluded.last_uid,
+            uidvalidity=COALESCE(excluded.uidvalidity, ingest_state.uidvalidity),
+            highestmodseq=excluded.highestmodseq,
+            updated_at=excluded.updated_at
+        """,
+        (source_type, mailbox, last_uid, uidvalidity, highestmodseq, _utc_now()),
+    )
+    conn.commit()
+
+
 def set_last_uid(conn: sqlite3.Connection, source_type: str, mailbox: str, last_uid: int) -> None:
     conn.execute(
         """
@@ -107,6 +209,26 @@ def set_last_uid(conn: sqlite3.Connection, source_type: str, mailbox: str, last_
     conn.commit()
 
 
+def clear_source_uids(conn: sqlite3.Connection, prefix: str) -> None:
+    """Forget every stored UID starting with ``prefix`` (e.g. "INBOX:")."""
+    conn.execute(
+        "UPDATE content_items SET source_uid=NULL WHERE substr(source_uid, 1, ?)=?",
+        (len(prefix), prefix),
+    )
+    conn.commit()
+
+
+def remap_source_uids(conn: sqlite3.Connection, source_uids_by_message_id: Dict[str, str]) -> None:
+    """Point existing items at their new UIDs after a UIDVALIDITY reset."""
+    if not source_uids_by_message_id:
+        return
+    conn.executemany(
+        "UPDATE content_items SET source_uid=? WHERE message_id=?",
+        [(source_uid, message_id) for message_id, source_uid in source_uids_by_message_id.items()],
+    )
+    conn.commit()
+
+
 def content_exists(
     conn: sqlite3.Connection,
     *,
@@ -138,7 +260,38 @@ def content_exists(
     return False
 
 
-def insert_content_item(conn: sqlite3.Connection, item: Dict[str, Any]) -> bool:
+def _existing_values(
+    conn: sqlite3.Connection,
+    column: str,
+    values: Iterable[Optional[str]],
+) -> Set[str]:
+    unique = sorted({value for value in values if value})
+    found: Set[str] = set()
+    for i in range(0, len(unique), BULK_QUERY_CHUNK):
+        chunk = unique[i : i + BULK_QUERY_CHUNK]
+        placeholders = ",".join(["?"] * len(chunk))
+        rows = conn.execute(
+            f"SELECT DISTINCT {column} FROM content_items WHERE {column} IN ({placeholders})",
+            chunk,
+        ).fetchall()
+        found.update(row[0] for row in rows)
+    return found
+
+
+def existing_message_ids(conn: sqlite3.Connection, message_ids: Iterable[Optional[str]]) -> Set[str]:
+    return _existing_values(conn, "message_id", message_ids)
+
+
+def existing_source_uids(conn: sqlite3.Connection, source_uids: Iterable[Optional[str]]) -> Set[str]:
+    return _existing_values(conn, "source_uid", source_uids)
+
+
+def insert_content_item(
+    conn: sqlite3.Connection,
+    item: Dict[str, Any],
+    *,
+    commit: bool = True,
+) -> bool:
     try:
         conn.execute(
             """
@@ -153,9 +306,11 @@ def insert_content_item(conn: sqlite3.Connection, item: Dict[str, Any]) -> bool:
                 extracted_text,
                 links_json,
                 link_content_json,
-                created_at
+                created_at,
+                parent_id,
+                story_index
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 item["content_id"],
@@ -169,9 +324,12 @@ def insert_content_item(conn: sqlite3.Connection, item: Dict[str, Any]) -> bool:
                 item.get("links_json"),
                 item.get("link_content_json"),
                 item.get("created_at") or _utc_now(),
+                item.get("parent_id"),
+                item.get("story_index"),
             ),
         )
-        conn.commit()
+        if commit:
+            conn.commit()
         return True
     except sqlite3.IntegrityError:
         return False
@@ -183,12 +341,14 @@ def get_content_items(
     since_hours: Optional[int] = None,
     max_items: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
+    """Top-level items (whole messages), newest first; stories are fetched
+    separately with ``get_story_items``."""
     params: List[Any] = []
-    where_clause = ""
+    where_clause = "WHERE parent_id IS NULL"
     if since_hours is not None:
         cutoff = datetime.utcnow() - timedelta(hours=since_hours)
         cutoff_str = cutoff.replace(microsecond=0).isoformat() + "Z"
-        where_clause = "WHERE created_at >= ?"
+        where_clause += " AND created_at >= ?"
         params.append(cutoff_str)
 
     limit_clause = ""
@@ -221,6 +381,206 @@ def get_content_items_by_ids(
     return [dict(row) for row in rows]
 
 
+def get_sender_texts(conn: sqlite3.Connection, sender: str, *, limit: int) -> List[str]:
+    """Most recent extracted_text values for one sender's whole messages."""
+    rows = conn.execute(
+        "SELECT extracted_text FROM content_items WHERE sender=? AND parent_id IS NULL "
+        "ORDER BY created_at DESC LIMIT ?",
+        (sender, limit),
+    ).fetchall()
+    return [row["extracted_text"] or "" for row in rows]
+
+
+def get_top_senders(conn: sqlite3.Connection, limit: int) -> List[Dict[str, Any]]:
+    rows = conn.execute(
+        "SELECT sender, COUNT(*) AS items FROM content_items "
+        "WHERE sender IS NOT NULL AND sender != '' AND parent_id IS NULL "
+        "GROUP BY sender ORDER BY items DESC LIMIT ?",
+        (limit,),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_story_items(conn: sqlite3.Connection, parent_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Child story items keyed by parent content_id, in story order."""
+    stories: Dict[str, List[Dict[str, Any]]] = {}
+    ids = list(dict.fromkeys(parent_ids))
+    for start in range(0, len(ids), BULK_QUERY_CHUNK):
+        chunk = ids[start : start + BULK_QUERY_CHUNK]
+        placeholders = ",".join(["?"] * len(chunk))
+        rows = conn.execute(
+            f"SELECT * FROM content_items WHERE parent_id IN ({placeholders}) "
+            "ORDER BY parent_id, story_index",
+            chunk,
+        ).fetchall()
+        for row in rows:
+            stories.setdefault(row["parent_id"], []).append(dict(row))
+    return stories
+
+
+def get_unenriched_items(
+    conn: sqlite3.Connection,
+    *,
+    since_hours: Optional[int] = None,
+    max_items: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Items whose links have not been fetched yet (``link_content_json`` is NULL), newest first."""
+    params: List[Any] = []
+    where_clause = "WHERE link_content_json IS NULL"
+    if since_hours is not None:
+        cutoff = datetime.utcnow() - timedelta(hours=since_hours)
+        where_clause += " AND created_at >= ?"
+        params.append(cutoff.replace(microsecond=0).isoformat() + "Z")
+    limit_clause = ""
+    if max_items is not None:
+        limit_clause = "LIMIT ?"
+        params.append(max_items)
+    rows = conn.execute(
+        f"SELECT * FROM content_items {where_clause} ORDER BY created_at DESC {limit_clause}",
+        params,
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def set_link_content(
+    conn: sqlite3.Connection,
+    content_id: str,
+    link_content: Dict[str, str],
+    *,
+    commit: bool = True,
+) -> None:
+    conn.execute(
+        "UPDATE content_items SET link_content_json=? WHERE content_id=?",
+        (json.dumps(link_content), content_id),
+    )
+    if commit:
+        conn.commit()
+
+
+def get_url_cache(
+    conn: sqlite3.Connection,
+    urls: Iterable[str],
+    *,
+    include_expired: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+    """url_cache rows keyed by URL; expired rows only with ``include_expired``
+    (their validators can still revalidate the content)."""
+    values = list(dict.fromkeys(url for url in urls if url))
+    cutoff = "" if include_expired else _utc_now()
+    cached: Dict[str, Dict[str, Any]] = {}
+    for start in range(0, len(values), BULK_QUERY_CHUNK):
+        chunk = values[start : start + BULK_QUERY_CHUNK]
+        placeholders = ",".join(["?"] * len(chunk))
+        rows = conn.execute(
+            f"SELECT * FROM url_cache WHERE url IN ({placeholders}) AND expires_at > ?",
+            [*chunk, cutoff],
+        ).fetchall()
+        for row in rows:
+            cached[row["url"]] = dict(row)
+    return cached
+
+
+def upsert_url_cache(
+    conn: sqlite3.Connection,
+    *,
+    url: str,
+    status: str,
+    content: Optional[str],
+    ttl: timedelta,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    commit: bool = True,
+) -> None:
+    now = datetime.utcnow().replace(microsecond=0)
+    conn.execute(
+        """
+        INSERT INTO url_cache(url, status, content, fetched_at, expires_at, etag, last_modified)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            status=excluded.status,
+            content=excluded.content,
+            fetched_at=excluded.fetched_at,
+            expires_at=excluded.expires_at,
+            etag=excluded.etag,
+            last_modified=excluded.last_modified
+        """,
+        (url, status, content, now.isoformat() + "Z", (now + ttl).isoformat() + "Z", etag, last_modified),
+    )
+    if commit:
+        conn.commit()
+
+
+def get_url_redirects(conn: sqlite3.Connection, urls: Iterable[str]) -> Dict[str, str]:
+    """Previously resolved redirect targets keyed by the redirecting URL."""
+    values = list(dict.fromkeys(url for url in urls if url))
+    targets: Dict[str, str] = {}
+    for start in range(0, len(values), BULK_QUERY_CHUNK):
+        chunk = values[start : start + BULK_QUERY_CHUNK]
+        placeholders = ",".join(["?"] * len(chunk))
+        rows = conn.execute(
+            f"SELECT url, target FROM url_redirects WHERE url IN ({placeholders})",
+            chunk,
+        ).fetchall()
+        targets.update({row["url"]: row["target"] for row in rows})
+    return targets
+
+
+def upsert_url_redirects(conn: sqlite3.Connection, targets: Dict[str, str], *, commit: bool = True) -> None:
+    if not targets:
+        return
+    now = _utc_now()
+    conn.executemany(
+        "INSERT INTO url_redirects(url, target, resolved_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(url) DO UPDATE SET target=excluded.target, resolved_at=excluded.resolved_at",
+        [(url, target, now) for url, target in targets.items()],
+    )
+    if commit:
+        conn.commit()
+
+
+def get_domain_health(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    rows = conn.execute("SELECT * FROM domain_health ORDER BY total_seconds DESC").fetchall()
+    return [dict(row) for row in rows]
+
+
+def upsert_domain_health(conn: sqlite3.Connection, rows: Iterable[Dict[str, Any]], *, commit: bool = True) -> None:
+    now = _utc_now()
+    conn.executemany(
+        """
+        INSERT INTO domain_health(
+            domain, requests, failures, timeouts, consecutive_failures,
+            total_seconds, open_until, last_error, updated_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(domain) DO UPDATE SET
+            requests=excluded.requests,
+            failures=excluded.failures,
+            timeouts=excluded.timeouts,
+            consecutive_failures=excluded.consecutive_failures,
+            total_seconds=excluded.total_seconds,
+            open_until=excluded.open_until,
+            last_error=excluded.last_error,
+            updated_at=excluded.updated_at
+        """,
+        [
+            (
+                row["domain"],
+                row["requests"],
+                row["failures"],
+                row["timeouts"],
+                row["consecutive_failures"],
+                row["total_seconds"],
+                row["open_until"],
+                row["last_error"],
+                now,
+            )
+            for row in rows
+        ],
+    )
+    if commit:
+        conn.commit()
+
+
 def get_ai_cache(conn: sqlite3.Connection, content_id: str) -> Optional[Dict[str, Any]]:
     row = conn.execute(
         "SELECT * FROM ai_cache WHERE content_id=?",
@@ -293,3 +653,47 @@ def insert_role_cache(
         (content_id, role_name, startup_angle, role_angle, _utc_now()),
     )
     conn.commit()
+
+
+def get_role_caches(
+    conn: sqlite3.Connection,
+    content_id: str,
+    role_names: Iterable[str],
+) -> Dict[str, Dict[str, Any]]:
+    """Cached angles of one item keyed by role name, for the given roles."""
+    names = list(dict.fromkeys(role_names))
+    if not names:
+        return {}
+    placeholders = ",".join(["?"] * len(names))
+    rows = conn.execute(
+        f"SELECT * FROM role_cache WHERE content_id=? AND role_name IN ({placeholders})",
+        [content_id, *names],
+    ).fetchall()
+    return {row["role_name"]: dict(row) for row in rows}
+
+
+def insert_role_caches(
+    conn: sqlite3.Connection,
+    *,
+    content_id: str,
+    angles: Dict[str, Tuple[str, str]],
+) -> None:
+    """Insert ``{role_name: (startup_angle, role_angle)}`` for one item in one transaction."""
+    created_at = _utc_now()
+    conn.executemany(
+        """
+        INSERT OR IGNORE INTO role_cache(
+            content_id,
+            role_name,
+            startup_angle,
+            role_angle,
+            created_at
+        )
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        [
+            (content_id, role_name, startup_angle, role_angle, created_at)
+            for role_name, (startup_angle, role_angle) in angles.items()
+        ],
+    )
+    conn.commit()
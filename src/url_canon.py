@@ -0,0 +1,163 @@
+import base64
+import binascii
+import re
+from typing import Optional
+from urllib.parse import parse_qsl, unquote, unquote_plus, urlsplit, urlunsplit
+
+
+# Query parameters that only identify the campaign, mailing or click.
+TRACKING_PARAMS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "yclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "mkt_tok",
+    "_hsenc",
+    "_hsmi",
+    "ck_subscriber_id",
+    "ref_src",
+    "referrer",
+    "s_cid",
+    "sc_cid",
+    "trk",
+    "cmpid",
+}
+TRACKING_PREFIXES = ("utm_", "__s", "oly_", "vero_", "pk_")
+# "ref" is only a referral tag on newsletter platforms and redirectors;
+# elsewhere it can select content (GitHub ?ref=<branch>).
+REF_PARAM_HOSTS = (
+    "substack.com",
+    "beehiiv.com",
+    "ghost.io",
+    "buttondown.email",
+    "tldrnewsletter.com",
+    "tldr.tech",
+    "mailchi.mp",
+    "convertkit.com",
+)
+
+# Parameters a redirector may carry its destination in.
+TARGET_PARAMS = ("url", "u", "q", "target", "redirect", "redirect_url", "redirect_uri", "dest", "destination", "link", "to")
+# Redirector hosts; only their URLs are unwrapped, so an archive link like
+# web.archive.org/web/2024/https:%2F%2Fexample.com stays as it is.
+_REDIRECT_HOST_RE = re.compile(
+    r"(^|\.)(click|clicks|link|links|l|lnk|out|go|redirect|track|tracking|trk|email|em|t)\.|"
+    r"(^|\.)(google\.[a-z.]+)$|list-manage\.com$|convertkit|sendgrid\.net$|mailchi\.mp$"
+)
+_BASE64_SEGMENT_RE = re.compile(r"^[A-Za-z0-9_\-+/=]{16,}$")
+_DEFAULT_PORTS = {"http": "80", "https": "443"}
+MAX_UNWRAP_DEPTH = 3
+
+
+def _is_http(value: str) -> bool:
+    return value.lower().startswith(("http://", "https://"))
+
+
+def _embedded_in_path(path: str) -> Optional[str]:
+    # e.g. tracking.tldrnewsletter.com/CL0/https:%2F%2Fexample.com%2Fpost/1/0100...
+    for segment in path.split("/"):
+        if "%2f" in segment.lower():
+            decoded = unquote(segment)
+            if _is_http(decoded):
+                return decoded
+    return None
+
+
+def _embedded_base64(path: str) -> Optional[str]:
+    # e.g. click.convertkit-mail.com/<id>/<token>/aHR0cHM6Ly9leGFtcGxlLmNvbS9wb3N0
+    for segment in reversed(path.split("/")):
+        if not _BASE64_SEGMENT_RE.match(segment):
+            continue
+        padded = segment + "=" * (-len(segment) % 4)
+        try:
+            decoded = base64.urlsafe_b64decode(padded.replace("+", "-").replace("/", "_")).decode("utf-8")
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            continue
+        if _is_http(decoded):
+            return decoded
+    return None
+
+
+def _embedded_in_query(host: str, query: str) -> Optional[str]:
+    if not query or not _REDIRECT_HOST_RE.search(host):
+        return None
+    params = dict(parse_qsl(query, keep_blank_values=True))
+    for name in TARGET_PARAMS:
+        value = params.get(name)
+        if value and _is_http(value):
+            return value
+    return None
+
+
+def unwrap_redirect(url: str) -> str:
+    """Return the destination of a redirector host's tracking link when it is
+    encoded in the URL itself (percent-encoded in the path, base64 in the
+    path, or a query parameter); otherwise return ``url`` unchanged."""
+    for _ in range(MAX_UNWRAP_DEPTH):
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return url
+        host = (parts.hostname or "").lower()
+        if not _REDIRECT_HOST_RE.search(host):
+            return url
+        target = (
+            _embedded_in_path(parts.path)
+            or _embedded_in_query(host, parts.query)
+            or _embedded_base64(parts.path)
+        )
+        if not target:
+            return url
+        url = target
+    return url
+
+
+def _strips_ref(host: str) -> bool:
+    return bool(_REDIRECT_HOST_RE.search(host)) or any(
+        host == suffix or host.endswith("." + suffix) for suffix in REF_PARAM_HOSTS
+    )
+
+
+def strip_tracking(url: str) -> str:
+    """Lowercase scheme and host, drop default ports, tracking query
+    parameters and the fragment, keeping the remaining parameters in order.
+    Fragments that look like client-side routes (``#/...``, ``#!...``) are
+    kept, since they select the page."""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    host, _, port = netloc.rpartition(":")
+    if host and port == _DEFAULT_PORTS.get(scheme):
+        netloc = host
+    query = parts.query
+    if query:
+        drop_ref = _strips_ref(parts.hostname or "")
+        # Kept parameters are copied as written; re-encoding them would turn
+        # %20 into + and change what some servers see.
+        segments = query.split("&")
+        kept = []
+        for segment in segments:
+            name = unquote_plus(segment.partition("=")[0]).lower()
+            if (
+                segment
+                and name not in TRACKING_PARAMS
+                and not name.startswith(TRACKING_PREFIXES)
+                and not (drop_ref and name == "ref")
+            ):
+                kept.append(segment)
+        if len(kept) != len(segments):
+            query = "&".join(kept)
+    fragment = parts.fragment if parts.fragment.startswith(("/", "!")) else ""
+    return urlunsplit((scheme, netloc, parts.path or "/", query, fragment))
+
+
+def canonical_url(url: str) -> str:
+    """Offline canonical form used for link dedupe, filtering and caching."""
+    return strip_tracking(unwrap_redirect(url))
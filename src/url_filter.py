@@ -0,0 +1,104 @@
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple
+from urllib.parse import urlsplit
+
+import yaml
+
+
+# The rules shipped with the repo, used when URL_FILTER_PATH (or
+# ./url_filters.yaml) does not exist. They are the only copy of the defaults.
+DEFAULT_URL_FILTER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "url_filters.yaml")
+
+
+def _clean(values: Optional[Iterable]) -> List[str]:
+    return [str(value).strip() for value in (values or []) if str(value).strip()]
+
+
+def _lower(values: Optional[Iterable]) -> List[str]:
+    return [value.lower() for value in _clean(values)]
+
+
+def _combine(patterns: List[str]) -> Optional[Pattern[str]]:
+    if not patterns:
+        return None
+    # Rules are compiled as written: lowercasing them would turn \D into \d.
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE)
+
+
+class UrlFilter:
+    """Exclusion rules compiled once: host rules are set lookups over the
+    URL's host suffixes, and all regex rules are merged into one pattern per
+    scope, so the cost per URL barely grows with the number of rules."""
+
+    def __init__(
+        self,
+        hosts: Optional[Iterable[str]] = None,
+        host_prefixes: Optional[Iterable[str]] = None,
+        host_paths: Optional[Iterable[str]] = None,
+        paths: Optional[Iterable[str]] = None,
+        patterns: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.hosts: Set[str] = {host.strip(".") for host in _lower(hosts)}
+        self.host_prefixes: Set[str] = {prefix.strip(".") for prefix in _lower(host_prefixes)}
+        self.host_paths: Dict[str, Tuple[str, ...]] = {}
+        for rule in _lower(host_paths):
+            host, _, path = rule.partition("/")
+            self.host_paths[host] = self.host_paths.get(host, ()) + ("/" + path,)
+        self.path_re = _combine(_clean(paths))
+        self.url_re = _combine(_clean(patterns))
+        self.rule_count = (
+            len(self.hosts)
+            + len(self.host_prefixes)
+            + sum(len(prefixes) for prefixes in self.host_paths.values())
+            + len(_clean(paths))
+            + len(_clean(patterns))
+        )
+
+    def excludes(self, url: str) -> bool:
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return False
+        host = parts.hostname or ""
+        # Everything after scheme://netloc, so "/manage?" style rules still see the "?".
+        rest = url[len(parts.scheme) + 3 + len(parts.netloc) :] if parts.netloc else url
+        # host_paths are matched lowercased, like the rules themselves.
+        rest_lower = rest.lower()
+
+        if host:
+            labels = host.split(".")
+            for i in range(len(labels)):
+                suffix = ".".join(labels[i:])
+                if suffix in self.hosts:
+                    return True
+                prefixes = self.host_paths.get(suffix)
+                if prefixes and rest_lower.startswith(prefixes):
+                    return True
+            if self.host_prefixes:
+                for i in range(1, len(labels)):
+                    if ".".join(labels[:i]) in self.host_prefixes:
+                        return True
+
+        if self.path_re is not None and self.path_re.search(rest):
+            return True
+        if self.url_re is not None and self.url_re.search(url):
+            return True
+        return False
+
+
+def load_url_filter(path: Optional[str] = None) -> UrlFilter:
+    path = path or os.getenv("URL_FILTER_PATH", "url_filters.yaml")
+    if not os.path.exists(path):
+        path = DEFAULT_URL_FILTER_PATH
+    rules: Dict[str, List[str]] = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as handle:
+            rules = yaml.safe_load(handle) or {}
+    return UrlFilter(
+        hosts=rules.get("hosts"),
+        host_prefixes=rules.get("host_prefixes"),
+        host_paths=rules.get("host_paths"),
+        paths=rules.get("paths"),
+        patterns=rules.get("patterns"),
+    )